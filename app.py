@@ -1,44 +1,476 @@
 from flask import Flask, request, jsonify
 from werkzeug.exceptions import HTTPException, BadRequest
-from langchain.retrievers import ContextualCompressionRetriever
-from langchain.retrievers.document_compressors import LLMChainExtractor
-from langchain_openai import OpenAI
-from langchain_community.vectorstores import Chroma
-from langchain.vectorstores import Chroma as LangChainChroma
-from langchain_community.embeddings import OpenAIEmbeddings
+from response_format import (
+    MAX_RESULT_LIMIT, ResultCache, check_cursor_results, compress_response, decode_cursor, encode_cursor,
+    format_result, install_json_provider, parse_fields, parse_non_negative_int, request_fingerprint,
+    result_list_digest
+)
+from functools import wraps
 import os
+import re
+import time
+import threading
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
-# Initialize Flask app
+# Initialize Flask app, serializing JSON with orjson when available
 app = Flask(__name__)
+install_json_provider(app)
+
+# Compressed result lists kept for cursor-based pagination
+result_cache = ResultCache()
 
 # Step 1: Set up OpenAI API Key
 os.environ['OPENAI_API_KEY'] = 'ENTER_API_KEY_HERE_'
 # Step 2: Define your ChromaDB client and collection
 chroma_db_path = "Chroma_db_storage"
 collection_name = "openai_sds_embeddings_metadata"
-embedding_model = OpenAIEmbeddings()
+RETRIEVAL_K = 10  # Retrieve up to 10 results
 
-vector_store = LangChainChroma(
-    persist_directory=chroma_db_path,
-    embedding_function=embedding_model,
-    collection_name=collection_name
-)
+# Filtered queries can be served from the in-process quantized store instead of Chroma.
+# Build it with `python quantized_store.py` (or setup_chromadb.py) and set SDS_VECTOR_STORE=quantized.
+VECTOR_STORE_BACKEND = os.environ.get("SDS_VECTOR_STORE", "chroma")
 
-# Step 3: Set up ContextualCompressionRetriever
-llm = OpenAI(temperature=0)  # Low-temperature LLM for accurate retrieval
-#import chatopenAI for using GPT 4 and 4o and try hyperparameters
+# Step 3: Configure the compression tiers
+# "llm" runs LLMChainExtractor on every document, "embedding" keeps only the sentences
+# that are similar enough to the query, and "hybrid" tries "embedding" first and
+# escalates to "llm" when its best sentence match is not confident enough.
+COMPRESSION_TIERS = ("llm", "embedding", "hybrid")
+DEFAULT_COMPRESSION_TIER = os.environ.get("SDS_COMPRESSION_TIER", "llm")
+SENTENCE_SIMILARITY_THRESHOLD = float(os.environ.get("SDS_SENTENCE_SIMILARITY_THRESHOLD", "0.80"))
+HYBRID_CONFIDENCE_THRESHOLD = float(os.environ.get("SDS_HYBRID_CONFIDENCE_THRESHOLD", "0.85"))
+if DEFAULT_COMPRESSION_TIER not in COMPRESSION_TIERS:
+    raise ValueError(f"SDS_COMPRESSION_TIER must be one of {COMPRESSION_TIERS}, got '{DEFAULT_COMPRESSION_TIER}'")
 
-compressor = LLMChainExtractor.from_llm(llm)
-retriever = vector_store.as_retriever(
-    search_kwargs={"k": 10}  # Retrieve up to 10 results
-)
-compression_retriever = ContextualCompressionRetriever(
-    base_compressor=compressor, base_retriever=retriever
-)
+# Corpus-wide search (requests without both product_name and supplier): one ANN query
+# fetches CORPUS_FETCH_K sections, grouped by product/supplier and diversified with MMR.
+CORPUS_FETCH_K = int(os.environ.get("SDS_CORPUS_FETCH_K", "100"))
+CORPUS_HITS_PER_GROUP = int(os.environ.get("SDS_CORPUS_HITS_PER_GROUP", "3"))
+CORPUS_MMR_LAMBDA = float(os.environ.get("SDS_CORPUS_MMR_LAMBDA", "0.7"))
+DEFAULT_PAGE_SIZE = 5
+MAX_PAGE_SIZE = 50
+
+# Offline per-section digests (see section_digests.py) answer common facet questions
+# (GHS classification, PPE, flash point, UN number, first aid) without an LLM call
+USE_DIGESTS = os.environ.get("SDS_USE_DIGESTS", "true").lower() in ("1", "true", "yes")
+
+# Incremental ingestion (see ingest_daemon.py): when set, `python app.py` also watches this
+# directory for new analyzeResult JSON files and serves the new products without a restart
+INGEST_WATCH_DIR = os.environ.get("SDS_INGEST_WATCH_DIR")
+# A standalone daemon (`python ingest_daemon.py`) updates the code index and quantized store
+# on disk; the API checks for such changes at most this often (seconds)
+STATE_CHECK_INTERVAL = float(os.environ.get("SDS_STATE_CHECK_INTERVAL", "5"))
+_state_checked_at = 0.0
+
+# Sentence embeddings are cached on disk so repeated sections are only embedded once
+embedding_cache_path = "Embedding_cache"
+
+# Step 4: Lazily constructed clients
+# Nothing below is built at import time. Each client is created on first use (or by
+# warm_up()), and the heavy LangChain/OpenAI/Chroma imports happen inside the builders.
+_clients = {}
+_clients_lock = threading.RLock()
+_warm_up_state = {"ready": False, "started_at": None, "duration": None, "error": None}
+
+def lazy_client(build):
+    """Caches the result of a client builder, building it once on first call."""
+    @wraps(build)
+    def getter():
+        if build.__name__ not in _clients:
+            with _clients_lock:
+                if build.__name__ not in _clients:
+                    logging.info(f"Initializing {build.__name__[len('get_'):]}...")
+                    _clients[build.__name__] = build()
+        return _clients[build.__name__]
+    return getter
+
+def reset_clients(keep=()):
+    """Drops the cached clients, except the getters named in keep, so that the next use builds fresh ones."""
+    with _clients_lock:
+        for name in list(_clients):
+            if name not in keep:
+                del _clients[name]
+        _warm_up_state.update(ready=False, started_at=None, duration=None, error=None)
+
+@lazy_client
+def get_embedding_model():
+    from langchain_community.embeddings import OpenAIEmbeddings
+    return OpenAIEmbeddings()
+
+@lazy_client
+def get_sentence_embedding_model():
+    from langchain.embeddings import CacheBackedEmbeddings
+    from langchain.storage import LocalFileStore
+    embedding_model = get_embedding_model()
+    return CacheBackedEmbeddings.from_bytes_store(
+        embedding_model, LocalFileStore(embedding_cache_path), namespace=embedding_model.model
+    )
+
+@lazy_client
+def get_vector_store():
+    from langchain.vectorstores import Chroma as LangChainChroma
+    return LangChainChroma(
+        persist_directory=chroma_db_path,
+        embedding_function=get_embedding_model(),
+        collection_name=collection_name
+    )
+
+@lazy_client
+def get_quantized_store():
+    if VECTOR_STORE_BACKEND != "quantized":
+        return None
+    from quantized_store import QuantizedVectorStore, quantized_store_path
+    return QuantizedVectorStore(quantized_store_path)
+
+@lazy_client
+def get_journal():
+    # The ingestion journal maps (product, supplier, section) to deduplicated section bodies
+    from ingestion_journal import IngestionJournal, journal_path
+    return IngestionJournal(journal_path)
+
+@lazy_client
+def get_digest_store():
+    from section_digests import DigestStore
+    return DigestStore()
+
+@lazy_client
+def get_property_store():
+    # Typed section 9/11/14 values extracted at ingestion, served without retrieval or an LLM
+    from sds_properties import PropertyStore
+    return PropertyStore()
+
+@lazy_client
+def get_regulatory_index():
+    # In-memory postings of H/P codes, CAS and UN numbers for exact and boolean code queries
+    from regulatory_index import RegulatoryIndex
+    return RegulatoryIndex()
+
+@lazy_client
+def get_llm():
+    from langchain_openai import OpenAI
+    #import chatopenAI for using GPT 4 and 4o and try hyperparameters
+    return OpenAI(temperature=0)  # Low-temperature LLM for accurate retrieval
+
+@lazy_client
+def get_compressor():
+    from langchain.retrievers.document_compressors import LLMChainExtractor
+    return LLMChainExtractor.from_llm(get_llm())
+
+def warm_up():
+    """Builds every client the configured deployment needs, and marks the API as ready."""
+    _warm_up_state.update(ready=False, started_at=time.time(), error=None)
+    try:
+        get_embedding_model()
+        if get_quantized_store() is None:
+            from chroma_retrieval import get_shard_router
+            if get_shard_router() is None:
+                get_vector_store()
+        if DEFAULT_COMPRESSION_TIER != "llm":
+            get_sentence_embedding_model()
+        get_journal()
+        get_property_store()
+        get_regulatory_index()
+        if USE_DIGESTS:
+            get_digest_store()
+        get_compressor()
+        import numpy  # noqa: F401  (used by the embedding tier)
+    except Exception as e:
+        logging.error(f"Warm-up failed: {str(e)}")
+        _warm_up_state["error"] = str(e)
+        raise
+    _warm_up_state.update(ready=True, duration=time.time() - _warm_up_state["started_at"])
+    logging.info(f"Warm-up complete in {_warm_up_state['duration']:.2f}s")
+
+# Pre-fork serving (see gunicorn.conf.py)
+# Only read-only, fork-safe state is loaded in the parent: the memory-mapped quantized store
+# and its catalog of documents and metadata, which workers then share copy-on-write.
+# Network clients (OpenAI, Chroma) hold sockets, locks and threads, so each worker builds its own.
+SHARED_CLIENTS = ("get_quantized_store",)
+# Set in the parent by load_shared_state(): workers then never open Chroma, whose client
+# (SQLite handles, background threads) is not safe to share or reopen across forks
+_prefork_serving = False
+
+def load_shared_state():
+    """Loads the read-only state shared by all workers. Called once in the parent before forking.
+
+    Pre-fork serving requires the quantized backend, so a misconfigured deployment fails
+    before any worker starts instead of opening one Chroma client per worker.
+    """
+    global _prefork_serving
+    if get_quantized_store() is None:
+        raise RuntimeError(
+            "Pre-fork serving requires SDS_VECTOR_STORE=quantized and a built quantized store "
+            "(python quantized_store.py). Use `python app.py` to serve from Chroma."
+        )
+    _prefork_serving = True
+    logging.info(f"Loaded quantized store with {len(get_quantized_store())} vectors for sharing across workers.")
+
+def after_fork():
+    """Re-creates per-process clients in a freshly forked worker, keeping the shared read-only state."""
+    global _clients_lock
+    _clients_lock = threading.RLock()  # The parent's lock may have been copied in a held state
+    import chroma_retrieval
+    chroma_retrieval._chroma_lock = threading.Lock()
+    chroma_retrieval.reset_client()
+    reset_clients(keep=SHARED_CLIENTS)
+    warm_up()
+
+def refresh_after_ingest(products):
+    """Makes the products of an ingested batch visible to the quantized store, when it is used."""
+    if VECTOR_STORE_BACKEND == "quantized":
+        from chroma_retrieval import get_collection, get_shard_router
+        from quantized_store import rebuild_quantized_store
+        rebuild_quantized_store(get_shard_router() or get_collection(), journal=get_journal())
+        with _clients_lock:
+            _clients.pop("get_quantized_store", None)  # Reopened on next use
+    logging.info(f"Ingested {len(products)} file(s), now serving: {sorted(set(products))}")
+
+def reload_changed_state():
+    """Reloads the code index and the quantized store once they changed on disk, at most every
+    STATE_CHECK_INTERVAL seconds. Needed when a standalone ingestion daemon updates them."""
+    global _state_checked_at
+    if time.time() - _state_checked_at < STATE_CHECK_INTERVAL:
+        return
+    _state_checked_at = time.time()
+    regulatory_index = _clients.get("get_regulatory_index")
+    if regulatory_index is not None and regulatory_index.reload_if_changed():
+        logging.info(f"Reloaded regulatory code index: {len(regulatory_index.products)} product(s).")
+    quantized_store = _clients.get("get_quantized_store")
+    if quantized_store is not None and quantized_store.is_outdated():
+        with _clients_lock:
+            _clients.pop("get_quantized_store", None)  # Reopened on next use
+        logging.info("Quantized store was rebuilt on disk, reopening it.")
+
+def start_ingest_watcher():
+    """Runs the ingestion daemon on INGEST_WATCH_DIR in a background thread, sharing this process's clients."""
+    from chroma_retrieval import get_collection, get_shard_router
+    from ingest_daemon import IngestDaemon
+    daemon = IngestDaemon(
+        INGEST_WATCH_DIR, collection=get_shard_router() or get_collection(), journal=get_journal(),
+        property_store=get_property_store(), regulatory_index=get_regulatory_index(), on_batch=refresh_after_ingest
+    )
+    threading.Thread(target=daemon.run, name="ingest-watcher", daemon=True).start()
+    return daemon
+
+def retrieve_documents(query, product_name, supplier, section_ids=None, filter_criteria=None, k=RETRIEVAL_K):
+    """Retrieves documents from the quantized store if enabled, otherwise through Chroma or its shards."""
+    from langchain.schema import Document
+    from chroma_retrieval import get_shard_router
+    quantized_store = get_quantized_store()
+    # Products ingested by the in-process watcher since the last quantized build are served from Chroma until
+    # the rebuild. A standalone daemon's Chroma writes are not visible here, so without the watcher (and in
+    # pre-forked workers) only the quantized store is read.
+    chroma_fallback = INGEST_WATCH_DIR and not _prefork_serving
+    if quantized_store is not None and (not chroma_fallback or quantized_store.contains(product_name, supplier)):
+        hits = quantized_store.search(
+            get_embedding_model().embed_query(query), product_name, supplier, section_ids=section_ids, k=k
+        )
+        return [Document(page_content=hit["document"], metadata=hit["metadata"]) for hit in hits]
+
+    # Deduplicated bodies carry no product metadata, so the filter goes through their hashes
+    refs_by_hash = {}
+    for ref in get_journal().section_refs(product_name, supplier, section_ids):
+        # One body can back several sections of the product (e.g. identical sections 11 and 12)
+        refs_by_hash.setdefault(ref["content_hash"], []).append(ref)
+    if refs_by_hash:
+        filter_criteria = {"content_hash": {"$in": list(refs_by_hash)}}
+
+    router = get_shard_router()
+    if router is None:
+        docs = get_vector_store().similarity_search(query, k=k, filter=filter_criteria)
+    else:
+        result = router.query(
+            get_embedding_model().embed_query(query), k, where=filter_criteria,
+            supplier=supplier, section_ids=section_ids
+        )
+        docs = [
+            Document(page_content=document, metadata=metadata)
+            for document, metadata in zip(result["documents"][0], result["metadatas"][0])
+        ]
+
+    if not refs_by_hash:
+        return docs
+    return [
+        Document(page_content=doc.page_content, metadata=ref)
+        for doc in docs
+        for ref in refs_by_hash.get(doc.metadata.get("content_hash"), [])
+    ]
+
+def answer_from_digests(query, product_name, supplier, section_ids=None):
+    """Returns digest documents when the query only asks about precomputed facets, otherwise None."""
+    answers = get_digest_store().lookup(query, product_name, supplier, section_ids)
+    if not answers:
+        return None
+    from langchain.schema import Document
+    return [
+        Document(page_content=answer["digest"], metadata={
+            "product_name": product_name,
+            "supplier": supplier,
+            "section_id": answer["section_id"],
+            "facet": answer["facet"],
+            "source": "digest"
+        })
+        for answer in answers
+    ]
+
+def build_where(conditions):
+    """Combines Chroma metadata conditions, which only accepts $and with two or more of them."""
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+def retrieve_corpus_hits(query, product_name=None, supplier=None, section_ids=None, k=CORPUS_FETCH_K):
+    """Runs a single, optionally partially filtered, similarity search over the whole corpus.
+
+    Returns hits with their document, metadata, cosine score and embedding.
+    """
+    from corpus_search import expand_shared_hits
+    query_embedding = get_embedding_model().embed_query(query)
+    quantized_store = get_quantized_store()
+    if quantized_store is not None:
+        return quantized_store.search_corpus(query_embedding, k, product_name, supplier, section_ids)
+
+    from chroma_retrieval import get_collection, get_shard_router
+    journal = get_journal()
+    shared = journal.has_shared_bodies()
+    conditions = []
+    if shared and (product_name or supplier or section_ids):
+        # Deduplicated bodies carry no product metadata, and only the section_id of the first
+        # section that stored them, so the filter goes through the hashes of the journal
+        hashes = sorted({ref["content_hash"] for ref in journal.section_refs(product_name, supplier, section_ids)})
+        if not hashes:
+            return []
+        conditions.append({"content_hash": {"$in": hashes}})
+    else:
+        if product_name:
+            conditions.append({"product_name": {"$eq": product_name}})
+        if supplier:
+            conditions.append({"supplier": {"$eq": supplier}})
+        if section_ids:
+            conditions.append({"section_id": {"$in": section_ids}})
+
+    include = ["documents", "metadatas", "distances", "embeddings"]
+    router = get_shard_router()
+    if router is None:
+        result = get_collection().query(
+            query_embeddings=[query_embedding], n_results=k, where=build_where(conditions), include=include
+        )
+    else:
+        result = router.query(
+            query_embedding, k, where=build_where(conditions), supplier=supplier, section_ids=section_ids, include=include
+        )
+    hits = [
+        # Squared L2 distance between unit vectors is 2 - 2 * cosine
+        {"id": record_id, "document": document, "metadata": metadata, "score": 1 - distance / 2, "embedding": embedding}
+        for record_id, document, metadata, distance, embedding in zip(
+            result["ids"][0], result["documents"][0], result["metadatas"][0],
+            result["distances"][0], result["embeddings"][0]
+        )
+    ]
+    if shared:
+        refs = journal.refs_for_hashes({hit["metadata"].get("content_hash") for hit in hits})
+        hits = expand_shared_hits(hits, refs, product_name, supplier, section_ids)
+    return hits
+
+def corpus_search_response(query, product_name, supplier, section_ids, compression_tier, page, page_size, presentation):
+    """Answers a corpus-wide query with one page of diversified product/supplier groups.
+
+    Compression only runs on the sections of the returned page. presentation holds the
+    format_result options (fields and content truncation).
+    """
+    from langchain.schema import Document
+    from corpus_search import group_hits, mmr_order, paginate
+
+    hits = retrieve_corpus_hits(query, product_name, supplier, section_ids)
+    groups = mmr_order(group_hits(hits, CORPUS_HITS_PER_GROUP), CORPUS_MMR_LAMBDA)
+    page_groups, pagination = paginate(groups, page, page_size)
+    if not page_groups:
+        return error_response("No matching SDS content found.", 404)
+
+    docs = [
+        Document(page_content=hit["document"], metadata=hit["metadata"])
+        for group in page_groups for hit in group["hits"]
+    ]
+    compressed_docs, answered_tier = compress_documents(docs, query, compression_tier)
+    results_by_group = {}
+    for doc in compressed_docs:
+        key = (doc.metadata.get("product_name"), doc.metadata.get("supplier"))
+        results_by_group.setdefault(key, []).append(format_result(doc.page_content, doc.metadata, **presentation))
+
+    return jsonify({
+        'status': 'success',
+        'data': {
+            'mode': 'corpus',
+            'count': len(page_groups),
+            'compression_tier': answered_tier,
+            'pagination': pagination,
+            'groups': [
+                {
+                    'product_name': group["product_name"],
+                    'supplier': group["supplier"],
+                    'score': group["score"],
+                    'results': results_by_group.get((group["product_name"], group["supplier"]), [])
+                }
+                for group in page_groups
+            ]
+        }
+    })
+
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.!?;])\s+|\n+")
+
+def split_sentences(text):
+    """Splits section text into non-empty sentences."""
+    return [s.strip() for s in SENTENCE_SPLIT_PATTERN.split(text) if s and s.strip()]
+
+def embedding_compress(docs, query, threshold=SENTENCE_SIMILARITY_THRESHOLD):
+    """Keeps only the sentences of each document whose embedding is close to the query.
+
+    Returns the compressed documents and a confidence score, which is the highest
+    cosine similarity seen between the query and any sentence.
+    """
+    import numpy as np
+    from langchain.schema import Document
+    sentences_per_doc = [split_sentences(doc.page_content) for doc in docs]
+    all_sentences = [s for sentences in sentences_per_doc for s in sentences]
+    if not all_sentences:
+        return [], 0.0
+
+    query_vector = np.asarray(get_embedding_model().embed_query(query), dtype=np.float32)
+    sentence_vectors = np.asarray(get_sentence_embedding_model().embed_documents(all_sentences), dtype=np.float32)
+    similarities = sentence_vectors @ query_vector
+    similarities /= np.linalg.norm(sentence_vectors, axis=1) * np.linalg.norm(query_vector) + 1e-12
+
+    compressed_docs = []
+    offset = 0
+    for doc, sentences in zip(docs, sentences_per_doc):
+        scores = similarities[offset:offset + len(sentences)]
+        offset += len(sentences)
+        kept = [s for s, score in zip(sentences, scores) if score >= threshold]
+        if kept:
+            compressed_docs.append(Document(
+                page_content=" ".join(kept),
+                metadata={**doc.metadata, "relevance_score": float(scores.max())}
+            ))
+    return compressed_docs, float(similarities.max())
+
+def compress_documents(docs, query, tier):
+    """Compresses the retrieved documents with the requested tier.
+
+    Returns the compressed documents and the name of the tier that actually answered.
+    """
+    if not docs:
+        return [], tier
+    if tier == "llm":
+        return get_compressor().compress_documents(docs, query), "llm"
+
+    compressed_docs, confidence = embedding_compress(docs, query)
+    logging.info(f"Embedding compression confidence: {confidence:.3f}")
+    if tier == "hybrid" and (not compressed_docs or confidence < HYBRID_CONFIDENCE_THRESHOLD):
+        logging.info("Low confidence from embedding tier, escalating to LLM compression")
+        return get_compressor().compress_documents(docs, query), "llm"
+    return compressed_docs, "embedding"
 
 # Standard error responses
 def error_response(message, status_code=400):
@@ -57,6 +489,22 @@ def health_check():
         'message': 'API is up and running!'
     })
 
+# Readiness endpoint, only succeeds once warm-up has built every client
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    if not _warm_up_state["ready"]:
+        message = f"Warm-up failed: {_warm_up_state['error']}" if _warm_up_state["error"] else "API is warming up."
+        return error_response(message, 503)
+    return jsonify({
+        'status': 'success',
+        'message': 'API is ready to serve requests.',
+        'warm_up_seconds': round(_warm_up_state["duration"], 3)
+    })
+
+@app.before_request
+def check_for_ingested_state():
+    reload_changed_state()
+
 # SDS retrieval endpoint
 @app.route('/api/sds', methods=['GET'])
 def get_sds_content():
@@ -66,10 +514,19 @@ def get_sds_content():
         supplier = request.args.get('supplier')
         section_id = request.args.get('section_id')  # Accept comma-separated input
         query = request.args.get('query')
+        compression_tier = request.args.get('compression', DEFAULT_COMPRESSION_TIER)
+        use_digests = request.args.get('digests', str(USE_DIGESTS)).lower() in ("1", "true", "yes")
+        cursor = request.args.get('cursor')
+        limit = parse_non_negative_int(request.args.get('limit'), 'limit', maximum=MAX_RESULT_LIMIT)
+        presentation = {
+            "fields": parse_fields(request.args.get('fields')),
+            "content_offset": parse_non_negative_int(request.args.get('content_offset'), 'content_offset', default=0),
+            "max_content_chars": parse_non_negative_int(request.args.get('max_content_chars'), 'max_content_chars')
+        }
 
         # Validate required parameters
-        if not product_name or not query or not supplier:
-            raise BadRequest("Missing required parameters: 'product_name' and/or 'query' and/or supplier")
+        if not query:
+            raise BadRequest("Missing required parameter: 'query'")
 
         # Parse section_id into a list if provided
         section_ids = None
@@ -79,46 +536,86 @@ def get_sds_content():
             except ValueError:
                 raise BadRequest("Invalid section_id format. Must be a comma-separated list of integers.")
 
+        if compression_tier not in COMPRESSION_TIERS:
+            raise BadRequest(f"Invalid compression tier. Must be one of: {', '.join(COMPRESSION_TIERS)}.")
+
         # Log parameters for debugging
-        logging.info(f"Request parameters - product_name: {product_name}, supplier: {supplier}, section_id: {section_id}, query: {query}")
+        logging.info(f"Request parameters - product_name: {product_name}, supplier: {supplier}, section_id: {section_id}, query: {query}, compression: {compression_tier}")
 
-        # Construct filter for retrieval
-        filter_criteria = {
-            "$and": [{"product_name": {"$eq": product_name}}]
-        }
-        if supplier:
-            filter_criteria["$and"].append({"supplier": {"$eq": supplier}})
-        if section_ids:
-            filter_criteria["$and"].append({"section_id": {"$in": section_ids}})
+        # Without both product_name and supplier, search the whole corpus (optionally partially filtered)
+        if not product_name or not supplier:
+            try:
+                page = int(request.args.get('page', 1))
+                page_size = int(request.args.get('page_size', DEFAULT_PAGE_SIZE))
+            except ValueError:
+                raise BadRequest("Invalid pagination. 'page' and 'page_size' must be integers.")
+            if page < 1 or not 1 <= page_size <= MAX_PAGE_SIZE:
+                raise BadRequest(f"Invalid pagination. 'page' must be >= 1 and 'page_size' between 1 and {MAX_PAGE_SIZE}.")
+            return corpus_search_response(
+                query, product_name or None, supplier or None, section_ids, compression_tier, page, page_size,
+                presentation
+            )
+
+        # Following a cursor reuses the cached result list of the original request. The cache is
+        # per process, so under gunicorn another worker usually recomputes the list, and the
+        # cursor's digest of the original list detects when it no longer matches
+        fingerprint = request_fingerprint(request.args)
+        offset, results_digest = decode_cursor(cursor, fingerprint) if cursor else (0, None)
+        cached = result_cache.get(fingerprint) if cursor else None
+
+        digest_docs = answer_from_digests(query, product_name, supplier, section_ids) if use_digests and cached is None else None
+        if digest_docs:
+            logging.info(f"Answered from digests: {[doc.metadata['facet'] for doc in digest_docs]}")
+            compressed_docs, answered_tier = digest_docs, "digest"
+        elif cached is None:
+            # Construct filter for retrieval
+            filter_criteria = {
+                "$and": [{"product_name": {"$eq": product_name}}]
+            }
+            if supplier:
+                filter_criteria["$and"].append({"supplier": {"$eq": supplier}})
+            if section_ids:
+                filter_criteria["$and"].append({"section_id": {"$in": section_ids}})
+
+            # Log filter criteria
+            logging.info(f"Filter criteria: {filter_criteria}")
 
-        # Log filter criteria
-        logging.info(f"Filter criteria: {filter_criteria}")
+            # Retrieve documents
+            docs = retrieve_documents(query, product_name, supplier, section_ids, filter_criteria)
 
-        # Update retriever with filter
-        retriever.search_kwargs["filter"] = filter_criteria
+            # Compress documents with the selected tier
+            compressed_docs, answered_tier = compress_documents(docs, query, compression_tier)
 
-        # Retrieve compressed documents
-        compressed_docs = compression_retriever.invoke(query)
+            # Log retrieved documents (metadata only, full contents can be megabytes)
+            logging.info(f"Retrieved {len(compressed_docs)} documents: {[doc.metadata for doc in compressed_docs]}")
+        else:
+            compressed_docs, answered_tier = cached
 
-        # Log retrieved documents
-        logging.info(f"Retrieved documents: {compressed_docs}")
+        if cursor:
+            check_cursor_results(results_digest, [doc.metadata for doc in compressed_docs])
 
         # If no results are found
         if not compressed_docs:
             return error_response("No matching SDS content found.", 404)
 
-        # Format results
-        results = [
-            {"content": doc.page_content, "metadata": doc.metadata}
-            for doc in compressed_docs
-        ]
+        # Select the requested page and format its results
+        page_docs = compressed_docs[offset:offset + limit] if limit else compressed_docs[offset:]
+        next_offset = offset + len(page_docs)
+        next_cursor = None
+        if next_offset < len(compressed_docs):
+            next_cursor = encode_cursor(fingerprint, next_offset, result_list_digest([doc.metadata for doc in compressed_docs]))
+            result_cache.put(fingerprint, (compressed_docs, answered_tier))
+        results = [format_result(doc.page_content, doc.metadata, **presentation) for doc in page_docs]
 
         # Successful response
         return jsonify({
             'status': 'success',
             'data': {
                 'count': len(results),
-                'results': results
+                'total': len(compressed_docs),
+                'compression_tier': answered_tier,
+                'results': results,
+                'next_cursor': next_cursor
             }
         })
 
@@ -134,6 +631,126 @@ def get_sds_content():
         logging.error(f"Unexpected error: {str(e)}")
         return error_response("An unexpected error occurred. Please try again later.", 500)
 
+# Structured property endpoint, exact and range lookups over the extracted property table
+@app.route('/api/properties', methods=['GET'])
+def get_sds_properties():
+    try:
+        from sds_properties import PROPERTY_SPECS, convert_query_value, parse_expression, resolve_property
+
+        product_name = request.args.get('product_name') or None
+        supplier = request.args.get('supplier') or None
+        species = (request.args.get('species') or '').strip().lower() or None
+        expression = request.args.get('expr')
+        property_param = request.args.get('property')
+        unit = request.args.get('unit')
+        limit = parse_non_negative_int(request.args.get('limit'), 'limit', default=1000, maximum=10000)
+
+        # Either an expression such as "flash point < 60 °C", or a property with eq/min/max bounds
+        bounds = {}
+        property_name = None
+        try:
+            if expression:
+                property_name, operator, value = parse_expression(expression)
+                if operator == "=":
+                    bounds["equals"] = value
+                elif operator in ("<", "<="):
+                    bounds.update(maximum=value, exclusive_max=operator == "<")
+                else:
+                    bounds.update(minimum=value, exclusive_min=operator == ">")
+            elif property_param:
+                property_name = resolve_property(property_param)
+                if property_name is None:
+                    raise ValueError(f"Unknown property '{property_param}'. Known properties: {', '.join(PROPERTY_SPECS)}")
+                for param, bound in (("eq", "equals"), ("min", "minimum"), ("max", "maximum")):
+                    if request.args.get(param) is not None:
+                        bounds[bound] = convert_query_value(property_name, float(request.args[param]), unit)
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+        # Without a property, list every property of one product
+        if property_name is None and not (product_name and supplier):
+            raise BadRequest("Missing parameter: 'expr' or 'property', or both 'product_name' and 'supplier'.")
+
+        logging.info(f"Property query - property: {property_name}, bounds: {bounds}, product_name: {product_name}, supplier: {supplier}, species: {species}")
+        results = get_property_store().query(
+            property_name, product_name=product_name, supplier=supplier, species=species, limit=limit, **bounds
+        )
+        if not results:
+            return error_response("No matching SDS properties found.", 404)
+
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'count': len(results),
+                'property': property_name,
+                'unit': PROPERTY_SPECS[property_name][3] if property_name else None,
+                'results': results
+            }
+        })
+
+    except BadRequest as e:
+        logging.error(f"BadRequest: {e}")
+        return error_response(str(e), 400)
+
+    except Exception as e:
+        logging.error(f"Unexpected error: {str(e)}")
+        return error_response("An unexpected error occurred. Please try again later.", 500)
+
+# Regulatory code endpoint, exact and boolean lookups over the inverted code index
+@app.route('/api/codes', methods=['GET'])
+def get_sds_codes():
+    try:
+        from regulatory_index import tokenize_query
+
+        query = request.args.get('q') or request.args.get('code')
+        limit = parse_non_negative_int(request.args.get('limit'), 'limit', default=1000, maximum=10000)
+        if not query:
+            raise BadRequest("Missing required parameter: 'q', e.g. 'H301 AND NOT UN2671'.")
+
+        index = get_regulatory_index()
+        try:
+            started = time.perf_counter()
+            products = index.search(query)
+            took_ms = (time.perf_counter() - started) * 1000
+            codes = [token for token in tokenize_query(query) if token not in ("AND", "OR", "NOT", "(", ")")]
+        except ValueError as e:
+            raise BadRequest(f"Invalid code query: {e}")
+
+        logging.info(f"Code query - q: {query}, matches: {len(products)}, took: {took_ms:.3f}ms")
+        if not products:
+            return error_response("No products match this code query.", 404)
+
+        results = [
+            {
+                'product_name': product_name,
+                'supplier': supplier,
+                'matched_codes': index.matched_codes(product_name, supplier, codes)
+            }
+            for product_name, supplier in products[:limit]
+        ]
+        return jsonify({
+            'status': 'success',
+            'data': {
+                'count': len(results),
+                'total': len(products),
+                'took_ms': round(took_ms, 3),
+                'results': results
+            }
+        })
+
+    except BadRequest as e:
+        logging.error(f"BadRequest: {e}")
+        return error_response(str(e), 400)
+
+    except Exception as e:
+        logging.error(f"Unexpected error: {str(e)}")
+        return error_response("An unexpected error occurred. Please try again later.", 500)
+
+# Compress JSON responses with br or gzip when the client accepts it
+@app.after_request
+def compress_json_response(response):
+    return compress_response(request, response)
+
 # Error handling for 404 Not Found
 @app.errorhandler(404)
 def not_found(error):
@@ -156,4 +773,12 @@ def handle_exception(e):
 
 # Start the Flask application
 if __name__ == '__main__':
+    # Warm up in the background so the server starts accepting requests immediately;
+    # /api/ready reports when the clients are built. With debug=True only the reloader's
+    # serving child needs the clients, the watching parent process skips warm-up.
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        threading.Thread(target=warm_up, daemon=True).start()
+        # The in-process watcher is for single-process serving, it makes new products visible to this process only
+        if INGEST_WATCH_DIR:
+            start_ingest_watcher()
     app.run(debug=True)
@@ -0,0 +1,201 @@
+# benchmark_prefork.py
+# Measures how throughput scales with the number of pre-forked worker processes.
+#
+#     python benchmark_prefork.py --workers 1 2 4 8
+#         Default "store" mode: no network calls. The quantized store is loaded once, then
+#         forked workers run searches with fixed query embeddings against the shared
+#         memory-mapped matrices, so the numbers reflect core usage only. Without a built
+#         store, --synthetic N benchmarks a random store of N vectors.
+#
+#     SDS_VECTOR_STORE=quantized python benchmark_prefork.py --mode http --workers 1 2 4 8
+#         Starts gunicorn with gunicorn.conf.py, waits for /api/ready, then keeps 2 * workers
+#         concurrent clients busy. Every request embeds its query through OpenAI, so this
+#         mostly measures remote latency.
+
+import argparse
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def wait_until_ready(base_url, timeout=120):
+    """Polls /api/ready until every worker has warmed up or the timeout expires."""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/api/ready", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, ConnectionError):
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Server at {base_url} did not become ready within {timeout}s")
+
+
+def run_clients(url, concurrency, duration):
+    """Sends requests from concurrency threads for duration seconds, returns (successes, failures)."""
+    deadline = time.time() + duration
+
+    def client():
+        successes, failures = 0, 0
+        while time.time() < deadline:
+            try:
+                with urllib.request.urlopen(url, timeout=60) as response:
+                    response.read()
+                    successes += 1
+            except (urllib.error.URLError, ConnectionError):
+                failures += 1
+        return successes, failures
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: client(), range(concurrency)))
+    return sum(r[0] for r in results), sum(r[1] for r in results)
+
+
+def search_loop(store, queries, operation, duration, results):
+    """Runs searches with fixed query embeddings for duration seconds in a forked worker."""
+    products = [key.split("\x1f") for key in store.groups]
+    deadline = time.time() + duration
+    count = 0
+    while time.time() < deadline:
+        query = queries[count % len(queries)]
+        if operation == "corpus":
+            store.search_corpus(query, k=100)
+        else:
+            product_name, supplier = products[count % len(products)]
+            store.search(query, product_name, supplier, k=10)
+        count += 1
+    results.put(count)
+
+
+def benchmark_store(worker_counts, duration, path, operation):
+    """Benchmarks quantized store searches in forked workers sharing the store loaded by this process."""
+    import numpy as np
+    from quantized_store import QuantizedVectorStore
+
+    store = QuantizedVectorStore(path)  # Loaded before forking, shared copy-on-write like under gunicorn
+    queries = np.random.default_rng(0).standard_normal((64, store.dim)).astype(np.float32)
+    context = multiprocessing.get_context("fork")
+    rows = []
+    for workers in worker_counts:
+        results = context.Queue()
+        processes = [
+            context.Process(target=search_loop, args=(store, queries, operation, duration, results))
+            for _ in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        searches = sum(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+        throughput = searches / duration
+        rows.append({"workers": workers, "requests_per_second": throughput, "failures": 0})
+        print(f"{workers} worker(s): {throughput:.1f} {operation} searches/s")
+    return rows
+
+
+def build_synthetic_store(size, dim=1536, sections=16):
+    """Builds a random quantized store of size vectors in a temporary directory, returns its path."""
+    import numpy as np
+    from quantized_store import build_quantized_store
+
+    class RandomCollection:
+        name = f"synthetic_{size}"
+
+        def get(self, include=()):
+            return {
+                "ids": [f"row_{i}" for i in range(size)],
+                "embeddings": np.random.default_rng(1).standard_normal((size, dim)).astype(np.float32),
+                "documents": [f"Section text {i}" for i in range(size)],
+                "metadatas": [
+                    {"product_name": f"Product {i // sections}", "supplier": "Synthetic", "section_id": i % sections + 1}
+                    for i in range(size)
+                ]
+            }
+
+    path = os.path.join(tempfile.mkdtemp(prefix="sds_benchmark_"), "Quantized_store")
+    build_quantized_store(RandomCollection(), path)
+    return path
+
+
+def print_scaling(rows):
+    """Prints throughput, speedup and per-worker efficiency relative to the first row."""
+    baseline = rows[0]["requests_per_second"] / rows[0]["workers"] if rows[0]["requests_per_second"] else 0
+    print(f"\n(measured on {os.cpu_count()} CPU core(s))")
+    print("workers  req/s    speedup  efficiency")
+    for row in rows:
+        speedup = row["requests_per_second"] / (baseline or 1)
+        row["efficiency"] = speedup / row["workers"]
+        print(f"{row['workers']:>7}  {row['requests_per_second']:>7.1f}  {speedup:>7.2f}  {row['efficiency']:>9.0%}")
+
+
+def benchmark(worker_counts, params, duration, port):
+    """Runs the benchmark for each worker count and prints the scaling table."""
+    base_url = f"http://127.0.0.1:{port}"
+    url = f"{base_url}/api/sds?{urllib.parse.urlencode(params)}"
+    rows = []
+
+    for workers in worker_counts:
+        env = {**os.environ, "SDS_WORKERS": str(workers), "SDS_BIND": f"127.0.0.1:{port}"}
+        server = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_until_ready(base_url)
+            run_clients(url, workers, 2)  # Warm the OS page cache and the workers
+            successes, failures = run_clients(url, 2 * workers, duration)
+        finally:
+            server.terminate()
+            server.wait()
+
+        throughput = successes / duration
+        rows.append({"workers": workers, "requests_per_second": throughput, "failures": failures})
+        print(f"{workers} worker(s): {throughput:.1f} req/s ({failures} failures)")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark pre-fork scaling of the SDS API.")
+    parser.add_argument("--mode", choices=("store", "http"), default="store",
+                        help="store: forked searches without network calls; http: /api/sds under gunicorn")
+    cores = os.cpu_count() or 1
+    parser.add_argument("--workers", type=int, nargs="+", default=[n for n in (1, 2, 4, 8, 16) if n < cores] + [cores],
+                        help="Worker counts to compare (default: powers of two up to the CPU core count)")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of load per worker count")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--product_name", default="4-Aminopyridine")
+    parser.add_argument("--supplier", default="Jubilant Ingrevia Limited")
+    parser.add_argument("--query", default="hazard,pf")
+    parser.add_argument("--compression", default="embedding")
+    parser.add_argument("--operation", choices=("filtered", "corpus"), default="corpus",
+                        help="Store mode: product-filtered searches or corpus-wide searches")
+    parser.add_argument("--synthetic", type=int, help="Store mode: benchmark a random store of this many vectors")
+    parser.add_argument("--output", help="Optional JSON file for the results")
+    args = parser.parse_args()
+
+    worker_counts = sorted(set(args.workers))
+    if worker_counts[-1] > cores:
+        # Workers beyond the core count only time-slice the same CPUs, so they measure contention, not scaling
+        print(f"Warning: {worker_counts[-1]} workers on {cores} CPU core(s); "
+              "counts above the core count do not show scaling.")
+    if args.mode == "store":
+        from quantized_store import quantized_store_path
+        path = build_synthetic_store(args.synthetic) if args.synthetic else quantized_store_path
+        results = benchmark_store(worker_counts, args.duration, path, args.operation)
+    else:
+        params = {"product_name": args.product_name, "supplier": args.supplier,
+                  "query": args.query, "compression": args.compression}
+        results = benchmark(worker_counts, params, args.duration, args.port)
+    print_scaling(results)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
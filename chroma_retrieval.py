@@ -1,23 +1,70 @@
 # chroma_retrieval.py
 
-import openai
-import chromadb
-import pandas as pd
+import hashlib
 import logging
+import random
+import threading
 import time
+from ingestion_journal import IngestionJournal, STATUS_DONE, STATUS_EMPTY, STATUS_FAILED
+from sharding import ShardRouter
 
-# Define your ChromaDB client and collection as a global variable
+# Define your ChromaDB client and collection. Both are created lazily on first use,
+# so importing this module does not open the persistent storage.
 chroma_db_path = "Chroma_db_storage"
-client = chromadb.PersistentClient(path=chroma_db_path)
-
-# Attempt to get the collection, or create it if it doesn't exist
 collection_name = "openai_sds_embeddings_metadata"
-try:
-    collection = client.get_collection(collection_name)
-    print(f"Collection '{collection_name}' loaded successfully.")
-except ValueError:  # Collection doesn't exist
-    collection = client.create_collection(collection_name)
-    print(f"Collection '{collection_name}' created successfully.")
+_chroma_state = {"client": None, "collection": None, "shard_router": None}
+_chroma_lock = threading.Lock()
+
+def get_client():
+    """Returns the ChromaDB persistent client, creating it on first use."""
+    if _chroma_state["client"] is None:
+        with _chroma_lock:
+            if _chroma_state["client"] is None:
+                import chromadb
+                _chroma_state["client"] = chromadb.PersistentClient(path=chroma_db_path)
+    return _chroma_state["client"]
+
+def get_collection():
+    """Returns the SDS collection, loading it or creating it if it doesn't exist."""
+    if _chroma_state["collection"] is None:
+        client = get_client()
+        with _chroma_lock:
+            if _chroma_state["collection"] is None:
+                try:
+                    _chroma_state["collection"] = client.get_collection(collection_name)
+                    print(f"Collection '{collection_name}' loaded successfully.")
+                except ValueError:  # Collection doesn't exist
+                    _chroma_state["collection"] = client.create_collection(collection_name)
+                    print(f"Collection '{collection_name}' created successfully.")
+    return _chroma_state["collection"]
+
+def get_shard_router():
+    """Returns the shard router when sharding is enabled (SDS_SHARDS > 0), otherwise None."""
+    from sharding import ShardRouter, num_shards, shard_key
+    if not num_shards:
+        return None
+    if _chroma_state["shard_router"] is None:
+        client = get_client()
+        with _chroma_lock:
+            if _chroma_state["shard_router"] is None:
+                _chroma_state["shard_router"] = ShardRouter(client, collection_name, num_shards, shard_key)
+                print(f"Shard router ready: {_chroma_state['shard_router'].name}.")
+    return _chroma_state["shard_router"]
+
+def reset_client():
+    """Forgets the cached client, collection and shard router, e.g. after a fork."""
+    with _chroma_lock:
+        _chroma_state["client"] = None
+        _chroma_state["collection"] = None
+        _chroma_state["shard_router"] = None
+
+def __getattr__(name):
+    # Keeps `from chroma_retrieval import client, collection` working without eager setup
+    if name == "client":
+        return get_client()
+    if name == "collection":
+        return get_collection()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # Section mapping for metadata
 SECTION_MAPPING = {
@@ -42,6 +89,7 @@ SECTION_MAPPING = {
 # Function to generate processed metadata for each row
 def generate_processed_metadata(df):
     """Generates metadata for each row, with each section mapped to the correct structure."""
+    import pandas as pd
     print("Generating processed metadata for each row...")
     sections = list(SECTION_MAPPING.values())
     
@@ -69,9 +117,23 @@ logging.basicConfig(filename='chromadb_errors.log', level=logging.DEBUG, format=
 
 
 
+# Exponential backoff with full jitter, shared by embedding and section retries
+def backoff_delay(attempt, base_delay=1.0, max_delay=60.0):
+    """Returns a random delay in [0, min(max_delay, base_delay * 2**attempt)] seconds."""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
 # Function to generate embeddings
-def get_embeddings(texts, model="text-embedding-ada-002", retry_attempts=3):
-    """Generates embeddings for a batch of texts using OpenAI API."""
+def get_embeddings(texts, model="text-embedding-ada-002", retry_attempts=5, base_delay=1.0, max_delay=60.0):
+    """Generates embeddings for a batch of texts using OpenAI API.
+
+    Rate limits and transient API errors are retried with exponential backoff and jitter.
+    Texts that still fail get None.
+    """
+    import openai
+    transient_errors = (
+        openai.error.RateLimitError, openai.error.APIError, openai.error.Timeout,
+        openai.error.APIConnectionError, openai.error.ServiceUnavailableError
+    )
     embeddings = []
     for text in texts:
         attempt = 0
@@ -81,9 +143,10 @@ def get_embeddings(texts, model="text-embedding-ada-002", retry_attempts=3):
                 response = openai.Embedding.create(input=[text], model=model)
                 embeddings.append(response['data'][0]['embedding'])
                 break
-            except openai.error.RateLimitError:
-                print(f"Rate limit reached for text: {text}. Retrying...")
-                time.sleep(5)  # Wait before retrying
+            except transient_errors as e:
+                delay = backoff_delay(attempt, base_delay, max_delay)
+                print(f"Transient error ({type(e).__name__}) for text: {text[:80]}. Retrying in {delay:.1f}s...")
+                time.sleep(delay)
                 attempt += 1
             except openai.error.InvalidRequestError as e:
                 print(f"Invalid input for text: {text}. Skipping. Error: {e}")
@@ -100,42 +163,127 @@ def get_embeddings(texts, model="text-embedding-ada-002", retry_attempts=3):
 
 
 
-def store_sds_documents_to_chromadb(df, collection):
-    """Stores each section of each document in ChromaDB with embeddings and metadata."""
+def normalize_section_text(text):
+    """Normalizes section text for deduplication: collapses whitespace and ignores case."""
+    return " ".join(text.split()).casefold()
+
+def content_hash(text):
+    """Content address of a section body, shared by every section with the same normalized text."""
+    return hashlib.sha256(normalize_section_text(text).encode("utf8")).hexdigest()
+
+def store_section(index, section, collection, journal, deduplicate=True, find_embedding=None):
+    """Embeds and stores one section, recording the outcome in the journal.
+
+    With deduplicate, the body is stored once under its content hash; later sections with
+    the same normalized text only record a pointer to it in the journal, without an
+    embedding call. find_embedding optionally looks up the embedding of a body already
+    stored elsewhere (another shard). Returns the resulting status: STATUS_DONE,
+    STATUS_EMPTY or STATUS_FAILED.
+    """
+    page_content = section.get('page_content', '').strip()
+    metadata = section.get('metadata', {})
+
+    if not page_content or not metadata:
+        print(f"Missing content or metadata in section: {section}")
+        if metadata:
+            journal.record(metadata, STATUS_EMPTY)
+        return STATUS_EMPTY
+
+    try:
+        body_hash = content_hash(page_content) if deduplicate else None
+        body_size = len(page_content.encode("utf8"))
+        if body_hash and collection.get(ids=[body_hash], include=[])["ids"]:
+            journal.record(metadata, STATUS_DONE, content_hash=body_hash, content_length=body_size)
+            return STATUS_DONE
+
+        # Generate embedding for the content, unless the body is already embedded in another shard
+        embedding = find_embedding(body_hash) if body_hash and find_embedding else None
+        if embedding is None:
+            embedding = get_embeddings([page_content])[0]
+        if not embedding:
+            print(f"Failed to generate embedding for section: {metadata}")
+            journal.record(metadata, STATUS_FAILED, "Failed to generate embedding")
+            return STATUS_FAILED
+
+        # Upsert keeps reruns idempotent if a section was stored but not yet journaled.
+        # Shared bodies carry no product metadata, the journal maps products to them.
+        collection.upsert(
+            embeddings=[embedding],
+            documents=[page_content],
+            ids=[body_hash] if body_hash else [f"{index}_{metadata.get('section_id', 'unknown')}"],
+            metadatas=[{"content_hash": body_hash, "section_id": metadata.get("section_id")}] if body_hash else [metadata]
+        )
+        journal.record(metadata, STATUS_DONE, content_hash=body_hash, content_length=body_size)
+        return STATUS_DONE
+    except Exception as e:
+        print(f"Unexpected error storing section: {metadata}. Error: {e}")
+        journal.record(metadata, STATUS_FAILED, str(e))
+        return STATUS_FAILED
+
+def store_sds_documents_to_chromadb(df, collection, journal=None, section_retries=3, deduplicate=True):
+    """Stores each section of each document in ChromaDB with embeddings and metadata.
+
+    Progress is checkpointed per (file, section) in the ingestion journal: sections already
+    stored in a previous run are skipped, and failed sections are retried up to
+    section_retries more times with exponential backoff before the run gives up on them.
+    With deduplicate, identical section bodies are embedded and stored only once.
+    collection may also be a ShardRouter, in which case each shard is written concurrently.
+    """
     print("Storing SDS documents to ChromaDB...")
-    successful_stores = 0
-    failed_stores = 0
+    journal = journal or IngestionJournal()
+    pending = []
+    already_stored = 0
 
     for index, row in df.iterrows():
         for section in row.get('processed_metadata', []):
-            try:
-                page_content = section.get('page_content', '').strip()
-                metadata = section.get('metadata', {})
-                
-                if not page_content or not metadata:
-                    print(f"Missing content or metadata in section: {section}")
-                    failed_stores += 1
-                    continue
+            metadata = section.get('metadata', {})
+            if metadata and journal.is_settled(metadata.get("File Name"), metadata.get("section_id")):
+                already_stored += 1
+                continue
+            pending.append((index, section))
 
-                # Generate embedding for the content
-                embedding = get_embeddings([page_content])[0]
-                
-                if embedding:
-                    collection.add(
-                        embeddings=[embedding],
-                        documents=[page_content],
-                        ids=[f"{index}_{metadata.get('section_id', 'unknown')}"],
-                        metadatas=[metadata]
-                    )
-                    successful_stores += 1
-                else:
-                    print(f"Failed to generate embedding for section: {section}")
-                    failed_stores += 1
-            except Exception as e:
-                print(f"Unexpected error storing section: {section}. Error: {e}")
-                failed_stores += 1
+    print(f"Resuming from journal: {already_stored} section(s) already processed, {len(pending)} to process.")
+    router = collection if isinstance(collection, ShardRouter) else None
+
+    def store_batch(batch, target, find_embedding=None):
+        stored, failed = 0, []
+        for index, section in batch:
+            status = store_section(index, section, target, journal, deduplicate, find_embedding)
+            if status == STATUS_DONE:
+                stored += 1
+            elif status == STATUS_FAILED:
+                failed.append((index, section))
+        return stored, failed
+
+    successful_stores = 0
+    for attempt in range(section_retries + 1):
+        if attempt:
+            delay = backoff_delay(attempt, base_delay=5.0, max_delay=300.0)
+            print(f"Retry round {attempt}/{section_retries} for {len(pending)} failed section(s) in {delay:.1f}s...")
+            time.sleep(delay)
+
+        if router is None:
+            stored, pending = store_batch(pending, collection)
+            successful_stores += stored
+        else:
+            # Each shard is written by its own thread, sections of a shard stay in order
+            batches = {}
+            for index, section in pending:
+                metadata = section.get('metadata', {})
+                shard = router.shard_for(metadata.get("supplier"), metadata.get("section_id", 1))
+                batches.setdefault(shard, []).append((index, section))
+            results = router.executor.map(
+                lambda shard: store_batch(batches[shard], router.collections[shard], router.find_embedding), batches
+            )
+            pending = []
+            for stored, failed in results:
+                successful_stores += stored
+                pending.extend(failed)
+        if not pending:
+            break
 
-    print(f"Storage complete. Successes: {successful_stores}, Failures: {failed_stores}")
+    print(f"Storage complete. Successes: {successful_stores}, Failures: {len(pending)}, Skipped: {already_stored}")
+    journal.print_summary()
 
 # NOTE: This is not being used in the API. We are using contextual compression included in the app.py code
 # Multi-parameter retrieval function with similarity search 
@@ -143,7 +291,7 @@ def multi_retrieve_section(product_name, query_parameters=None, supplier=None, s
     """Retrieves relevant sections based on product_name, optional supplier, section_id, and query_parameters."""
     print(f"Retrieving sections for product '{product_name}' with query parameters {query_parameters}...")
     # Step 1: Initial filter by product_name
-    product_results = collection.get(where={"product_name": product_name})
+    product_results = get_collection().get(where={"product_name": product_name})
     
     # Step 2: Further filter by supplier if provided
     if supplier:
@@ -0,0 +1,88 @@
+# corpus_search.py
+# Grouping, diversification and pagination of corpus-wide search results. A single ANN
+# query over the whole collection returns section hits; these helpers turn them into
+# one entry per (product, supplier), ordered so that near-duplicate products do not
+# crowd out the rest of the corpus.
+
+import numpy as np
+
+
+def group_hits(hits, per_group=3):
+    """Groups section hits by (product, supplier), keeping the best per_group hits of each group.
+
+    Each hit is a dict with "document", "metadata", "score" and "embedding". Groups are
+    returned best first, scored by their best hit.
+    """
+    groups = {}
+    for hit in sorted(hits, key=lambda h: -h["score"]):
+        key = (hit["metadata"].get("product_name"), hit["metadata"].get("supplier"))
+        group = groups.setdefault(key, {
+            "product_name": key[0],
+            "supplier": key[1],
+            "score": hit["score"],
+            "embedding": hit["embedding"],
+            "hits": []
+        })
+        if len(group["hits"]) < per_group:
+            group["hits"].append(hit)
+    return list(groups.values())
+
+
+def mmr_order(groups, lambda_mult=0.7):
+    """Orders groups by maximal marginal relevance.
+
+    Each step picks the group maximizing lambda_mult * score - (1 - lambda_mult) * similarity
+    to the groups already picked, using the embedding of each group's best hit.
+    """
+    if len(groups) < 2:
+        return list(groups)
+    vectors = np.asarray([g["embedding"] for g in groups], dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    relevance = np.asarray([g["score"] for g in groups], dtype=np.float32)
+
+    selected = [int(np.argmax(relevance))]
+    max_similarity = vectors @ vectors[selected[0]]
+    remaining = np.ones(len(groups), dtype=bool)
+    remaining[selected[0]] = False
+    while remaining.any():
+        mmr = lambda_mult * relevance - (1 - lambda_mult) * max_similarity
+        mmr[~remaining] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        remaining[best] = False
+        max_similarity = np.maximum(max_similarity, vectors @ vectors[best])
+    return [groups[i] for i in selected]
+
+
+def paginate(items, page, page_size):
+    """Returns the items of a 1-based page and the pagination details."""
+    start = (page - 1) * page_size
+    return items[start:start + page_size], {
+        "page": page,
+        "page_size": page_size,
+        "total_groups": len(items),
+        "has_more": start + page_size < len(items)
+    }
+
+
+def expand_shared_hits(hits, refs, product_name=None, supplier=None, section_ids=None):
+    """Turns hits on deduplicated bodies into one hit per (product, supplier, section) pointing at them.
+
+    refs are the journal references of the hit bodies. The optional filters drop the
+    references that do not match a partially filtered query.
+    """
+    refs_by_hash = {}
+    for ref in refs:
+        if product_name is not None and ref["product_name"] != product_name:
+            continue
+        if supplier is not None and ref["supplier"] != supplier:
+            continue
+        if section_ids and ref["section_id"] not in section_ids:
+            continue
+        refs_by_hash.setdefault(ref["content_hash"], []).append(ref)
+
+    return [
+        {**hit, "metadata": ref}
+        for hit in hits
+        for ref in refs_by_hash.get(hit["metadata"].get("content_hash"), [])
+    ]
@@ -0,0 +1,32 @@
+# gunicorn.conf.py
+# Pre-fork multi-process serving for the SDS API:
+#
+#     SDS_VECTOR_STORE=quantized gunicorn -c gunicorn.conf.py app:app
+#
+# The app is imported once in the parent (preload_app), which loads the read-only quantized
+# store and catalog; workers inherit them copy-on-write and only rebuild their network clients.
+# Startup fails in when_ready without the quantized backend: workers never open ChromaDB.
+
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get("SDS_BIND", "127.0.0.1:5000")
+workers = int(os.environ.get("SDS_WORKERS", multiprocessing.cpu_count()))
+worker_class = "sync"
+timeout = int(os.environ.get("SDS_WORKER_TIMEOUT", "120"))  # LLM compression can be slow
+preload_app = True
+
+
+def when_ready(server):
+    import app
+    app.load_shared_state()
+    # Move everything allocated so far out of the collector's reach, so that garbage
+    # collection in the workers does not touch (and copy) the shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    import app
+    app.after_fork()
+    server.log.info(f"Worker {worker.pid} ready.")
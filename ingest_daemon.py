@@ -0,0 +1,381 @@
+# ingest_daemon.py
+# Long-running incremental ingestion of Azure Document Intelligence `analyzeResult` JSON
+# files. A drop directory is scanned for new or changed files (on watchdog events when the
+# package is installed, by polling otherwise), and each file goes through the chunking of
+# Chunking.ipynb, metadata extraction, embedding and upsert. A bounded queue feeds a fixed
+# pool of workers, so a large drop blocks the scanner instead of piling up in memory.
+#
+# Run it standalone with `python ingest_daemon.py [directory]`, or inside the API process
+# by setting SDS_INGEST_WATCH_DIR, which serves the new products without a restart.
+
+import glob
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+
+from chroma_retrieval import backoff_delay, content_hash, store_section
+from ingestion_journal import IngestionJournal, STATUS_DONE, STATUS_EMPTY, STATUS_FAILED
+from sharding import ShardRouter
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # The directory is only polled
+    Observer = None
+
+watch_dir = os.environ.get("SDS_INGEST_WATCH_DIR", "incoming")
+INGEST_WORKERS = int(os.environ.get("SDS_INGEST_WORKERS", "4"))
+INGEST_QUEUE_SIZE = int(os.environ.get("SDS_INGEST_QUEUE_SIZE", "16"))
+POLL_INTERVAL = float(os.environ.get("SDS_INGEST_POLL_INTERVAL", "5"))
+SETTLE_SECONDS = 2.0  # A file modified more recently may still be being written
+MAX_FILE_ATTEMPTS = 5  # A file failing this often is left alone until it changes
+RETRY_BASE_DELAY = 30.0  # Seconds before the first retry of a failed file, doubled on each attempt
+RETRY_MAX_DELAY = 3600.0
+
+# Section headings seen in the SDS PDFs, from Chunking.ipynb
+SECTION_TITLES = {
+    1: ["IDENTIFICATION", "1. IDENTIFICATION", "1. Chemical product and company identification",
+        "1. PRODUCT AND COMPANY IDENTIFICATION",
+        "SECTION 1 Identification of the substance / mixture and of the company / undertaking",
+        "SECTION 1. IDENTIFICATION", "SECTION 1: Identification",
+        "SECTION 1: Identification of the substance/mixture and of the company/undertaking",
+        "SECTION 1: IDENTIFICATION OF THE SUBSTANCE/MIXTURE AND OF THE COMPANY/UNDERTAKING.",
+        "Section: 1. PRODUCT AND COMPANY IDENTIFICATION"],
+    2: ["2. Hazards identification", "2. Hazard(s) identification", "SECTION 2 Hazards identification",
+        "SECTION 2. HAZARDS IDENTIFICATION", "SECTION 2: Hazard(s) identification", "SECTION 2: Hazards identification",
+        "SECTION 2: HAZARD(S) IDENTIFICATION.", "Section: 2. HAZARDS IDENTIFICATION"],
+    3: ["3. Composition/information on ingredients", "3. Composition, Information on Ingredients",
+        "SECTION 3 Composition / information on ingredients", "SECTION 3. COMPOSITION/INFORMATION ON INGREDIENTS",
+        "SECTION 3: Composition/information on ingredients", "SECTION 3: COMPOSITION/INFORMATION ON INGREDIENTS.",
+        "Section: 3. COMPOSITION/INFORMATION ON INGREDIENTS"],
+    4: ["4. First-aid measures", "4. FIRST AID MEASURES", "SECTION 4 First aid measures", "SECTION 4. FIRST AID MEASURES",
+        "SECTION 4: First-aid measures", "SECTION 4: FIRST AID MEASURES", "Section: 4. FIRST AID MEASURES"],
+    5: ["5. Fire-fighting measures", "5. FIREFIGHTING MEASURES", "SECTION 5 Firefighting measures",
+        "SECTION 5. FIREFIGHTING MEASURES", "SECTION 5. FIRE-FIGHTING MEASURES", "SECTION 5: Firefighting measures",
+        "SECTION 5: FIRE-FIGHTING MEASURES", "Section: 5. FIREFIGHTING MEASURES"],
+    6: ["6. Accidental release measures", "SECTION 6 Accidental release measures",
+        "SECTION 6. ACCIDENTAL RELEASE MEASURES", "SECTION 6: ACCIDENTAL RELEASE MEASURES",
+        "Section: 6. ACCIDENTAL RELEASE MEASURES"],
+    7: ["7. Handling and storage", "SECTION 7 Handling and storage", "SECTION 7. HANDLING AND STORAGE",
+        "SECTION 7: HANDLING AND STORAGE", "Section: 7. HANDLING AND STORAGE"],
+    8: ["8. Exposure controls and personal protection", "8. EXPOSURE CONTROLS / PERSONAL",
+        "8. EXPOSURE CONTROLS / PERSONAL PROTECTION", "8. EXPOSURE CONTROLS/PERSONAL PROTECTION",
+        "Section: 8. EXPOSURE CONTROLS/PERSONAL PROTECTION", "SECTION 8 Exposure controls / personal protection",
+        "SECTION 8. EXPOSURE CONTROLS/PERSONAL PROTECTION", "SECTION 8: Exposure controls/personal protection",
+        "SECTION 8: EXPOSURE CONTROLS / PERSONAL PROTECTION"],
+    9: ["9. Physical and chemical properties", "Section: 9. PHYSICAL AND CHEMICAL PROPERTIES",
+        "SECTION 9 : PHYSICAL AND CHEMICAL PROPERTIES", "SECTION 9 Physical and chemical properties",
+        "SECTION 9. PHYSICAL AND CHEMICAL PROPERTIES", "SECTION 9: Physical and chemical properties"],
+    10: ["10. Stability and reactivity", "SECTION 10 Stability and reactivity", "SECTION 10. STABILITY AND REACTIVITY",
+         "SECTION 10: Stability and reactivity", "Section: 10. STABILITY AND REACTIVITY"],
+    11: ["11. Toxicological information", "SECTION 11 Toxicological information",
+         "SECTION 11. TOXICOLOGICAL INFORMATION", "SECTION 11: Toxicological information",
+         "Section: 11. TOXICOLOGICAL INFORMATION"],
+    12: ["12. Ecological information", "SECTION 12 Ecological information", "SECTION 12. ECOLOGICAL INFORMATION",
+         "SECTION 12: Ecological information", "Section: 12. ECOLOGICAL INFORMATION"],
+    13: ["13. Disposal considerations", "SECTION 13 Disposal considerations", "SECTION 13. DISPOSAL CONSIDERATIONS",
+         "SECTION 13: DISPOSAL CONSIDERATIONS", "Section: 13. DISPOSAL CONSIDERATIONS"],
+    14: ["14. Transport information", "SECTION 14 Transport information", "SECTION 14. TRANSPORT INFORMATION",
+         "SECTION 14: TRANSPORT INFORMATION", "Section: 14. TRANSPORT INFORMATION"],
+    15: ["15. Regulatory information", "SECTION 15 Regulatory information", "SECTION 15. REGULATORY INFORMATION",
+         "SECTION 15: Regulatory information", "Section: 15. REGULATORY INFORMATION"],
+    16: ["16. Other information", "16. Other information, including date of preparation or last revision",
+         "16.Other information, including date of preparation or last revision", "SECTION 16 Other information",
+         "SECTION 16. OTHER INFORMATION", "SECTION 16: OTHER INFORMATION", "Section: 16. OTHER INFORMATION"],
+}
+
+# Product and supplier labels of section 1, most specific first
+PRODUCT_PATTERNS = [r"Product name\s*[:\-]?\s*(.+)", r"Trade name\s*[:\-]?\s*(.+)", r"Product identifier\s*[:\-]?\s*(.+)"]
+SUPPLIER_PATTERNS = [
+    r"Details of supplier of safety data sheet\s*:\s*Name of manufacturer/supplier\s*:\s*(.+)",
+    r"Manufacturer/Importer/Supplier/Distributor information\s*Company Name\s*:\s*(.+)",
+    r"Company identification\s*:\s*Manufacturer's Name\s*(.+)",
+    r"Company name of supplier\s*[:\-]?\s*(.+)",
+    r"Name of the supplier\s*:\s*(.+)",
+    r"S\s*u\s*p\s*p\s*l\s*i\s*e\s*r\s*:\s*(.+)",
+    r"Manufacturer\s*:\s*(.+)",
+    r"Produced by\s*:\s*(.+)",
+    r"Company\s*:\s*(.+)",
+]
+
+
+def load_analyze_result(path):
+    """Returns the text content of an Azure analyzeResult JSON file."""
+    with open(path, encoding="utf8") as f:
+        data = json.load(f)
+    content = data.get("analyzeResult", data).get("content")
+    if not content:
+        raise ValueError(f"No analyzeResult.content in '{path}'")
+    return content
+
+
+def find_section_start(text, section_titles):
+    for title in section_titles:
+        match = re.search(re.escape(title), text, re.IGNORECASE)
+        if match:
+            return match.start()
+    return None
+
+
+def first_label_value(patterns, text):
+    """Returns the value following the first label found, or None."""
+    for pattern in patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        value = match.group(1).strip(" :-\t") if match else ""
+        if value and value.lower() not in ("n/a", "not applicable"):
+            return value
+    return None
+
+
+def split_sections(text):
+    """Splits a document into its SDS sections, returning ({section_id: text}, product_name, supplier).
+
+    A section ends where the next section found in the document starts.
+    """
+    starts = {section_id: find_section_start(text, titles) for section_id, titles in SECTION_TITLES.items()}
+    split_data = {}
+    for section_id, start in starts.items():
+        if start is None:
+            continue
+        end = min((s for s in starts.values() if s is not None and s > start), default=len(text))
+        split_data[section_id] = text[start:end].strip()
+
+    identification = split_data.get(1, text)
+    return split_data, first_label_value(PRODUCT_PATTERNS, identification), first_label_value(SUPPLIER_PATTERNS, identification)
+
+
+def build_sections(file_name, text):
+    """Chunks one document into the processed_metadata entries of generate_processed_metadata()."""
+    split_data, product_name, supplier = split_sections(text)
+    return [
+        {
+            "page_content": split_data.get(section_id, ""),
+            "metadata": {
+                "File Name": file_name,
+                "product_name": product_name or file_name,
+                "supplier": supplier or "Unknown",
+                "section_id": section_id
+            }
+        }
+        for section_id in SECTION_TITLES
+    ]
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class IngestDaemon:
+    """Watches a directory and ingests its new or changed analyzeResult files with bounded concurrency."""
+
+    def __init__(self, directory=watch_dir, collection=None, journal=None, property_store=None, regulatory_index=None,
+                 digest_store=None, workers=INGEST_WORKERS, queue_size=INGEST_QUEUE_SIZE, poll_interval=POLL_INTERVAL,
+                 on_batch=None):
+        from chroma_retrieval import get_collection, get_shard_router
+        from regulatory_index import RegulatoryIndex
+        from sds_properties import PropertyStore
+        from section_digests import DigestStore
+
+        self.directory = directory
+        self.collection = collection or get_shard_router() or get_collection()
+        self.journal = journal or IngestionJournal()
+        self.property_store = property_store or PropertyStore()
+        self.regulatory_index = regulatory_index or RegulatoryIndex()
+        self.digest_store = digest_store or DigestStore()
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.on_batch = on_batch  # Called with the (product_name, supplier) pairs of each drained batch
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.wake = threading.Event()
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.in_flight = set()
+        self.seen = {}  # Path -> (size, mtime) of the last version handled
+        self.retry_at = {}  # Path -> (size, mtime) of a failed version and the time of its next attempt
+        self.ingested = []
+
+    def scan(self):
+        """Queues the new or changed files of the directory, blocking while the queue is full.
+
+        Returns True when some file was skipped because it may still be being written.
+        """
+        settling = False
+        for path in sorted(glob.glob(os.path.join(self.directory, "*"))):
+            if self.stopping.is_set():
+                break
+            if not path.lower().endswith(".json"):
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if time.time() - stat.st_mtime < SETTLE_SECONDS:
+                settling = True
+                continue
+            signature = (stat.st_size, stat.st_mtime_ns)
+            with self.lock:
+                if path in self.in_flight or self.seen.get(path) == signature:
+                    continue
+                # A failed file is retried with exponential backoff, or right away once it changes
+                retry = self.retry_at.get(path)
+                if retry and retry[0] == signature and time.time() < retry[1]:
+                    continue
+
+            digest = file_hash(path)
+            recorded = self.journal.source_file(path)
+            if recorded and recorded["file_hash"] == digest and (
+                    recorded["status"] == STATUS_DONE or recorded["attempts"] >= MAX_FILE_ATTEMPTS):
+                with self.lock:
+                    self.seen[path] = signature
+                continue
+            with self.lock:
+                self.in_flight.add(path)
+            self.queue.put((path, digest, signature))  # Backpressure: waits for a free slot
+        return settling
+
+    def ingest_file(self, path):
+        """Chunks, embeds and stores one file, then indexes its properties and codes.
+
+        Returns the (product_name, supplier) of the file and the number of failed sections.
+        """
+        from regulatory_index import INDEXED_SECTIONS, extract_codes
+        from sds_properties import PROPERTY_SPECS, extract_properties
+
+        file_name = os.path.splitext(os.path.basename(path))[0]
+        sections = build_sections(file_name, load_analyze_result(path))
+        product = (sections[0]["metadata"]["product_name"], sections[0]["metadata"]["supplier"])
+        previous_product = self.journal.file_product(file_name)
+        property_sections = {spec[0] for spec in PROPERTY_SPECS.values()}
+        router = self.collection if isinstance(self.collection, ShardRouter) else None
+
+        failed = 0
+        for section in sections:
+            section_id = section["metadata"]["section_id"]
+            text = section["page_content"]
+            if not text:
+                # Sections missing from the document are expected, not errors
+                self.journal.record(section["metadata"], STATUS_EMPTY)
+            else:
+                target, find_embedding = self.collection, None
+                if router is not None:
+                    target, find_embedding = router.collections[router.shard_for(product[1], section_id)], router.find_embedding
+                if store_section(file_name, section, target, self.journal, find_embedding=find_embedding) == STATUS_FAILED:
+                    failed += 1
+                    continue
+            # An emptied section clears what an earlier version of the file indexed
+            if section_id in property_sections:
+                self.property_store.replace_section(*product, section_id, extract_properties(section_id, text) if text else [])
+            if section_id in INDEXED_SECTIONS:
+                self.regulatory_index.replace_section(*product, section_id, extract_codes(text) if text else [])
+            self.digest_store.invalidate(*product, section_id, keep_hash=content_hash(text) if text else None)
+
+        # A file re-ingested under another product name leaves nothing behind under the old one
+        if previous_product and previous_product != product and not self.journal.has_product(*previous_product):
+            self.property_store.remove_product(*previous_product)
+            self.regulatory_index.remove_product(*previous_product)
+            self.digest_store.invalidate(*previous_product)
+        return product, failed
+
+    def work(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.queue.task_done()
+                return
+            path, digest, signature = item
+            done = False
+            attempts = 0
+            try:
+                started = time.time()
+                product, failed = self.ingest_file(path)
+                done = not failed
+                error = None if done else f"{failed} section(s) failed"
+                self.journal.record_source(path, digest, STATUS_DONE if done else STATUS_FAILED, error)
+                attempts = self.journal.source_file(path)["attempts"]
+                print(f"Ingested '{os.path.basename(path)}' ({product[0]}, {product[1]}) in {time.time() - started:.1f}s"
+                      + ("" if done else f", {error}, will retry"))
+                with self.lock:
+                    self.ingested.append(product)
+            except Exception as e:
+                print(f"Failed to ingest '{path}': {e}")
+                self.journal.record_source(path, digest, STATUS_FAILED, str(e))
+                attempts = self.journal.source_file(path)["attempts"]
+            finally:
+                with self.lock:
+                    self.in_flight.discard(path)
+                    if done:
+                        self.seen[path] = signature
+                        self.retry_at.pop(path, None)
+                    else:
+                        delay = backoff_delay(attempts, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+                        self.retry_at[path] = (signature, time.time() + delay)
+                self.queue.task_done()
+                self.wake.set()
+
+    def refresh_if_idle(self):
+        """Once every queued file is processed, refreshes the indexes serving the new products."""
+        with self.lock:
+            if self.in_flight or not self.ingested:
+                return
+            products, self.ingested = self.ingested, []
+        self.regulatory_index.load()
+        if self.on_batch is not None:
+            self.on_batch(products)
+
+    def run(self):
+        """Scans and ingests until stop() is called."""
+        os.makedirs(self.directory, exist_ok=True)
+        print(f"Watching '{self.directory}' for analyzeResult JSON files "
+              f"({self.workers} worker(s), queue of {self.queue.maxsize}, {'watchdog' if Observer else 'polling'})...")
+        threads = [threading.Thread(target=self.work, name=f"ingest-{i}", daemon=True) for i in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        observer = None
+        if Observer is not None:
+            handler = FileSystemEventHandler()
+            handler.on_any_event = lambda event: self.wake.set()
+            observer = Observer()
+            observer.schedule(handler, self.directory)
+            observer.start()
+
+        try:
+            while not self.stopping.is_set():
+                self.wake.clear()
+                settling = self.scan()
+                self.refresh_if_idle()
+                self.wake.wait(min(self.poll_interval, SETTLE_SECONDS) if settling else self.poll_interval)
+        finally:
+            if observer is not None:
+                observer.stop()
+                observer.join()
+            for _ in threads:
+                self.queue.put(None)
+
+    def stop(self):
+        self.stopping.set()
+        self.wake.set()
+
+
+if __name__ == "__main__":
+    import sys
+    from quantized_store import rebuild_quantized_store
+
+    # A running API keeps its own Chroma client, which does not see another process's writes; it only picks
+    # up the rebuilt quantized store. With Chroma serving, ingest through the API's in-process watcher instead.
+    if os.environ.get("SDS_VECTOR_STORE") != "quantized":
+        sys.exit("ingest_daemon.py: standalone ingestion requires SDS_VECTOR_STORE=quantized; "
+                 "with ChromaDB serving, set SDS_INGEST_WATCH_DIR for app.py instead")
+    daemon = IngestDaemon(sys.argv[1] if len(sys.argv) > 1 else watch_dir)
+    daemon.on_batch = lambda products: rebuild_quantized_store(daemon.collection, journal=daemon.journal)
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
@@ -0,0 +1,241 @@
+# ingestion_journal.py
+
+import sqlite3
+import threading
+import time
+
+# The journal is a small SQLite database next to the Chroma storage
+journal_path = "ingestion_journal.db"
+
+# Section states
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_EMPTY = "empty"  # No content to embed, never retried
+
+
+class IngestionJournal:
+    """Durable record of the ingestion state of every (file, section).
+
+    Reruns of the ingestion skip the sections already marked done, so a crashed or
+    partially failed load resumes where it stopped instead of starting over.
+    """
+
+    def __init__(self, path=journal_path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sections (
+                file_name TEXT NOT NULL,
+                section_id INTEGER NOT NULL,
+                product_name TEXT,
+                supplier TEXT,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL NOT NULL,
+                content_hash TEXT,
+                content_length INTEGER,
+                PRIMARY KEY (file_name, section_id)
+            )
+        """)
+        # Journals created before content deduplication lack the shared body columns
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(sections)")}
+        for column, column_type in (("content_hash", "TEXT"), ("content_length", "INTEGER")):
+            if column not in columns:
+                self.conn.execute(f"ALTER TABLE sections ADD COLUMN {column} {column_type}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sections_by_product ON sections (product_name, supplier)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS sections_by_hash ON sections (content_hash)")
+        # Source documents picked up by the ingestion daemon, to process only new or changed files
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS source_files (
+                path TEXT PRIMARY KEY,
+                file_hash TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    def status(self, file_name, section_id):
+        """Returns the recorded status of a section, or None if it was never attempted."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT status FROM sections WHERE file_name = ? AND section_id = ?",
+                (str(file_name), int(section_id))
+            ).fetchone()
+        return row[0] if row else None
+
+    def is_settled(self, file_name, section_id):
+        """True when the section does not need to be processed again."""
+        return self.status(file_name, section_id) in (STATUS_DONE, STATUS_EMPTY)
+
+    def record(self, metadata, status, error=None, content_hash=None, content_length=None):
+        """Records the outcome of one attempt at ingesting a section, committing it immediately.
+
+        Deduplicated sections also record the hash of the shared body they point at.
+        """
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO sections (file_name, section_id, product_name, supplier, status, attempts, last_error,
+                                      updated_at, content_hash, content_length)
+                VALUES (?, ?, ?, ?, ?, 1, ?, ?, ?, ?)
+                ON CONFLICT (file_name, section_id) DO UPDATE SET
+                    product_name = excluded.product_name,
+                    supplier = excluded.supplier,
+                    status = excluded.status,
+                    attempts = sections.attempts + 1,
+                    last_error = excluded.last_error,
+                    updated_at = excluded.updated_at,
+                    content_hash = excluded.content_hash,
+                    content_length = excluded.content_length
+            """, (
+                str(metadata.get("File Name")), int(metadata.get("section_id")),
+                metadata.get("product_name"), metadata.get("supplier"),
+                status, error, time.time(), content_hash, content_length
+            ))
+            self.conn.commit()
+
+    def source_file(self, path):
+        """Returns the recorded file_hash, status and attempts of a source file, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT file_hash, status, attempts FROM source_files WHERE path = ?", (str(path),)
+            ).fetchone()
+        return dict(zip(("file_hash", "status", "attempts"), row)) if row else None
+
+    def record_source(self, path, file_hash, status, error=None):
+        """Records the outcome of ingesting a source file. Attempts restart when its content changed."""
+        with self.lock:
+            self.conn.execute("""
+                INSERT INTO source_files (path, file_hash, status, attempts, last_error, updated_at)
+                VALUES (?, ?, ?, 1, ?, ?)
+                ON CONFLICT (path) DO UPDATE SET
+                    attempts = CASE WHEN source_files.file_hash = excluded.file_hash
+                                    THEN source_files.attempts + 1 ELSE 1 END,
+                    file_hash = excluded.file_hash,
+                    status = excluded.status,
+                    last_error = excluded.last_error,
+                    updated_at = excluded.updated_at
+            """, (str(path), file_hash, status, error, time.time()))
+            self.conn.commit()
+
+    def file_product(self, file_name):
+        """Returns the (product_name, supplier) a file was last ingested as, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT product_name, supplier FROM sections WHERE file_name = ? ORDER BY updated_at DESC LIMIT 1",
+                (str(file_name),)
+            ).fetchone()
+        return tuple(row) if row else None
+
+    def has_product(self, product_name, supplier):
+        """True when some file is still recorded under this product and supplier."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM sections WHERE product_name = ? AND supplier = ? LIMIT 1", (product_name, supplier)
+            ).fetchone()
+        return row is not None
+
+    def section_refs(self, product_name=None, supplier=None, section_ids=None):
+        """Returns the stored sections pointing at a shared body, optionally filtered by product, supplier and section."""
+        query = """
+            SELECT file_name, product_name, supplier, section_id, content_hash
+            FROM sections WHERE status = ? AND content_hash IS NOT NULL
+        """
+        params = [STATUS_DONE]
+        if product_name is not None:
+            query += " AND product_name = ?"
+            params.append(product_name)
+        if supplier is not None:
+            query += " AND supplier = ?"
+            params.append(supplier)
+        if section_ids:
+            query += f" AND section_id IN ({', '.join('?' * len(section_ids))})"
+            params.extend(int(section_id) for section_id in section_ids)
+        with self.lock:
+            rows = self.conn.execute(query + " ORDER BY product_name, supplier, section_id", params).fetchall()
+        keys = ("File Name", "product_name", "supplier", "section_id", "content_hash")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def has_shared_bodies(self):
+        """True when the collection was ingested with deduplicated section bodies."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT 1 FROM sections WHERE status = ? AND content_hash IS NOT NULL LIMIT 1", (STATUS_DONE,)
+            ).fetchone()
+        return row is not None
+
+    def refs_for_hashes(self, content_hashes):
+        """Returns every stored section pointing at one of the given shared bodies."""
+        content_hashes = list(content_hashes)
+        if not content_hashes:
+            return []
+        with self.lock:
+            rows = self.conn.execute(f"""
+                SELECT file_name, product_name, supplier, section_id, content_hash
+                FROM sections WHERE status = ? AND content_hash IN ({', '.join('?' * len(content_hashes))})
+            """, [STATUS_DONE, *content_hashes]).fetchall()
+        keys = ("File Name", "product_name", "supplier", "section_id", "content_hash")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def dedup_report(self, embedding_dim=1536):
+        """Summarizes how many embedding calls and how much storage deduplication saved.
+
+        Storage counts the section text plus its float32 embedding.
+        """
+        with self.lock:
+            sections, unique_bodies, total_chars = self.conn.execute("""
+                SELECT COUNT(*), COUNT(DISTINCT content_hash), COALESCE(SUM(content_length), 0)
+                FROM sections WHERE status = ? AND content_hash IS NOT NULL
+            """, (STATUS_DONE,)).fetchone()
+            unique_chars = self.conn.execute("""
+                SELECT COALESCE(SUM(content_length), 0) FROM (
+                    SELECT MAX(content_length) AS content_length FROM sections
+                    WHERE status = ? AND content_hash IS NOT NULL GROUP BY content_hash
+                )
+            """, (STATUS_DONE,)).fetchone()[0]
+        saved_embeddings = sections - unique_bodies
+        return {
+            "sections": sections,
+            "unique_bodies": unique_bodies,
+            "embedding_calls_saved": saved_embeddings,
+            "bytes_saved": (total_chars - unique_chars) + saved_embeddings * embedding_dim * 4
+        }
+
+    def counts(self):
+        """Returns the number of sections in each status."""
+        with self.lock:
+            return dict(self.conn.execute("SELECT status, COUNT(*) FROM sections GROUP BY status").fetchall())
+
+    def missing(self):
+        """Returns the sections that are still not stored, with their last error."""
+        with self.lock:
+            rows = self.conn.execute("""
+                SELECT file_name, section_id, product_name, supplier, attempts, last_error
+                FROM sections WHERE status = ? ORDER BY file_name, section_id
+            """, (STATUS_FAILED,)).fetchall()
+        keys = ("file_name", "section_id", "product_name", "supplier", "attempts", "last_error")
+        return [dict(zip(keys, row)) for row in rows]
+
+    def print_summary(self):
+        """Prints the status counts and every section that is still missing."""
+        counts = self.counts()
+        print(f"Ingestion journal '{self.path}': " + ", ".join(f"{status}: {count}" for status, count in sorted(counts.items())))
+        missing = self.missing()
+        if missing:
+            print(f"{len(missing)} section(s) still missing, rerun the ingestion to retry them:")
+            for item in missing:
+                print(f"  - {item['file_name']} / section {item['section_id']} ({item['product_name']}, {item['supplier']}): "
+                      f"{item['attempts']} attempt(s), last error: {item['last_error']}")
+        report = self.dedup_report()
+        if report["sections"]:
+            print(f"Deduplication: {report['sections']} section(s) share {report['unique_bodies']} unique bodies, "
+                  f"saving {report['embedding_calls_saved']} embedding call(s) and {report['bytes_saved'] / 1e6:.2f} MB.")
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
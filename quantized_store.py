@@ -0,0 +1,290 @@
+# quantized_store.py
+
+import json
+import os
+import shutil
+import time
+from collections import defaultdict
+
+import numpy as np
+
+# The store lives next to the Chroma storage and is rebuilt from it
+quantized_store_path = "Quantized_store"
+QUANTIZED_DTYPES = ("float16", "int8")
+
+
+def group_key(product_name, supplier):
+    """Builds the lookup key of a (product, supplier) group."""
+    return f"{product_name}\x1f{supplier}"
+
+
+def quantize(vectors, dtype):
+    """Quantizes normalized float32 vectors to float16 or int8.
+
+    int8 vectors use one scale per row, so that row * scale recovers the original vector.
+    """
+    if dtype == "float16":
+        return vectors.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(vectors).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.round(vectors / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    raise ValueError(f"Unsupported dtype '{dtype}'. Must be one of {QUANTIZED_DTYPES}")
+
+
+def build_entries(ids, metadatas, journal=None):
+    """Lists the searchable (row, metadata) entries of the store.
+
+    Without deduplicated sections every row is its own entry. Deduplicated bodies are shared,
+    so their entries come from the journal: one per (product, supplier, section) that points
+    at the body, all referencing the same row.
+    """
+    refs = journal.section_refs() if journal is not None else []
+    if not refs:
+        return [(row, metadata) for row, metadata in enumerate(metadatas)]
+    row_by_id = {record_id: row for row, record_id in enumerate(ids)}
+    return [(row_by_id[ref["content_hash"]], ref) for ref in refs if ref["content_hash"] in row_by_id]
+
+
+def build_quantized_store(collection, path=quantized_store_path, dtype="int8", keep_full_precision=False, journal=None):
+    """Exports a Chroma collection (or a ShardRouter) into a memory-mappable quantized store.
+
+    Vectors are normalized, quantized and written as .npy matrices. Entries are grouped by
+    (product_name, supplier) so that a filtered query only touches the rows of its group.
+    keep_full_precision also writes a float32 copy for rescoring, which costs more disk
+    than the quantized matrix saves.
+    """
+    print(f"Building quantized store ({dtype}) from collection '{collection.name}'...")
+    data = collection.get(include=["embeddings", "documents", "metadatas"])
+    if not data["ids"]:
+        raise ValueError(f"Collection '{collection.name}' is empty, nothing to export.")
+
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    vectors /= norms
+    quantized, scales = quantize(vectors, dtype)
+
+    groups = defaultdict(list)
+    for row, metadata in build_entries(data["ids"], data["metadatas"], journal):
+        groups[group_key(metadata.get("product_name"), metadata.get("supplier"))].append((row, metadata))
+
+    # All entries are stored in flat arrays, the index keeps the [start, end) offsets of each group
+    entry_rows, entry_sections, entry_metadatas = [], [], []
+    group_offsets = {}
+    for key, entries in groups.items():
+        group_offsets[key] = [len(entry_rows), len(entry_rows) + len(entries)]
+        for row, metadata in entries:
+            entry_rows.append(row)
+            entry_sections.append(metadata.get("section_id", 0))
+            entry_metadatas.append(metadata)
+
+    os.makedirs(path, exist_ok=True)
+    # Optional matrices from a previous build must not outlive it
+    for optional_file in ("scales.npy", "vectors_full.npy"):
+        if os.path.exists(os.path.join(path, optional_file)):
+            os.remove(os.path.join(path, optional_file))
+
+    np.save(os.path.join(path, "vectors.npy"), quantized)
+    if scales is not None:
+        np.save(os.path.join(path, "scales.npy"), scales)
+    if keep_full_precision:
+        np.save(os.path.join(path, "vectors_full.npy"), vectors)
+    np.save(os.path.join(path, "entry_rows.npy"), np.asarray(entry_rows, dtype=np.int32))
+    np.save(os.path.join(path, "entry_sections.npy"), np.asarray(entry_sections, dtype=np.int16))
+
+    with open(os.path.join(path, "records.json"), "w", encoding="utf8") as f:
+        json.dump({"ids": data["ids"], "documents": data["documents"], "entry_metadatas": entry_metadatas}, f)
+    with open(os.path.join(path, "index.json"), "w", encoding="utf8") as f:
+        json.dump({"dtype": dtype, "dim": int(vectors.shape[1]), "groups": group_offsets}, f)
+
+    print(f"Quantized store written to '{path}': {len(data['ids'])} vectors, {len(entry_rows)} entries, "
+          f"{len(group_offsets)} groups, {quantized.nbytes / 1e6:.1f} MB quantized vs {vectors.nbytes / 1e6:.1f} MB float32.")
+
+
+def rebuild_quantized_store(collection, path=quantized_store_path, journal=None, **options):
+    """Rebuilds the store in a staging directory and swaps it in.
+
+    Readers that memory-mapped the previous build keep valid mappings, since its files
+    are unlinked rather than overwritten.
+    """
+    staging, retired = f"{path}.staging", f"{path}.old"
+    shutil.rmtree(staging, ignore_errors=True)
+    shutil.rmtree(retired, ignore_errors=True)
+    build_quantized_store(collection, staging, journal=journal, **options)
+    if os.path.exists(path):
+        os.rename(path, retired)
+    os.rename(staging, path)
+    shutil.rmtree(retired, ignore_errors=True)
+
+
+class QuantizedVectorStore:
+    """Read-only, memory-mapped vector store for (product, supplier) filtered search."""
+
+    def __init__(self, path=quantized_store_path):
+        self.version = self.disk_version(path)
+        with open(os.path.join(path, "index.json"), encoding="utf8") as f:
+            index = json.load(f)
+        with open(os.path.join(path, "records.json"), encoding="utf8") as f:
+            records = json.load(f)
+
+        self.path = path
+        self.dtype = index["dtype"]
+        self.dim = index["dim"]
+        self.groups = index["groups"]
+        self.ids = records["ids"]
+        self.documents = records["documents"]
+        self.entry_metadatas = records["entry_metadatas"]
+
+        # Matrices are memory-mapped, only the rows touched by a query are paged in
+        self.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")
+        self.entry_rows = np.load(os.path.join(path, "entry_rows.npy"), mmap_mode="r")
+        self.entry_sections = np.load(os.path.join(path, "entry_sections.npy"), mmap_mode="r")
+        scales_path = os.path.join(path, "scales.npy")
+        self.scales = np.load(scales_path, mmap_mode="r") if os.path.exists(scales_path) else None
+        full_path = os.path.join(path, "vectors_full.npy")
+        self.full_vectors = np.load(full_path, mmap_mode="r") if os.path.exists(full_path) else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def disk_version(path):
+        """Identifies the build at path: each rebuild swaps in a new index.json."""
+        try:
+            stat = os.stat(os.path.join(path, "index.json"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def is_outdated(self):
+        """True when another build (e.g. by a standalone ingestion daemon) was swapped in since loading."""
+        version = self.disk_version(self.path)
+        return version is not None and version != self.version
+
+    def contains(self, product_name, supplier):
+        """True when the store has entries for a (product, supplier) group."""
+        return group_key(product_name, supplier) in self.groups
+
+    def entries_for(self, product_name, supplier, section_ids=None):
+        """Returns the entry numbers of a (product, supplier) group, optionally restricted to some sections."""
+        offsets = self.groups.get(group_key(product_name, supplier))
+        if offsets is None:
+            return np.empty(0, dtype=np.int64)
+        entries = np.arange(offsets[0], offsets[1])
+        if section_ids:
+            entries = entries[np.isin(self.entry_sections[entries], section_ids)]
+        return entries
+
+    def score_rows(self, query_embedding, rows, full_precision=False, chunk_size=4096):
+        """Computes the cosine similarity between the query and the given rows.
+
+        Rows are dequantized in chunks, so scanning the whole corpus never materializes
+        a full float32 copy of the matrix.
+        """
+        query = np.array(query_embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+        scores = np.empty(len(rows), dtype=np.float32)
+        for start in range(0, len(rows), chunk_size):
+            chunk = rows[start:start + chunk_size]
+            scores[start:start + chunk_size] = self.row_vectors(chunk, full_precision) @ query
+        return scores
+
+    def row_vectors(self, rows, full_precision=False):
+        """Returns the (dequantized) float32 vectors of the given rows."""
+        if full_precision:
+            return np.asarray(self.full_vectors[rows])
+        vectors = np.asarray(self.vectors[rows], dtype=np.float32)
+        if self.scales is not None:
+            vectors *= np.asarray(self.scales[rows])[:, None]
+        return vectors
+
+    def search(self, query_embedding, product_name, supplier, section_ids=None, k=10, rescore=True):
+        """Returns the k most similar sections of a (product, supplier) group.
+
+        Scores are computed on the quantized vectors. When rescore is set and full-precision
+        vectors were kept, the best 2*k candidates are rescored in float32, but only when the
+        group is larger than that shortlist (otherwise the quantized pass would decide nothing).
+        """
+        entries = self.entries_for(product_name, supplier, section_ids)
+        if not len(entries):
+            return []
+
+        scores = self.score_rows(query_embedding, self.entry_rows[entries])
+        order = np.argsort(-scores)
+        if rescore and self.full_vectors is not None and len(entries) > 2 * k:
+            entries = entries[order[:2 * k]]
+            scores = self.score_rows(query_embedding, self.entry_rows[entries], full_precision=True)
+            order = np.argsort(-scores)
+
+        results = []
+        for i in order[:k]:
+            row = int(self.entry_rows[entries[i]])
+            results.append({
+                "id": self.ids[row],
+                "document": self.documents[row],
+                "metadata": self.entry_metadatas[entries[i]],
+                "score": float(scores[i])
+            })
+        return results
+
+    def search_corpus(self, query_embedding, k=100, product_name=None, supplier=None, section_ids=None, rescore=True):
+        """Returns the sections of the k most similar bodies across the whole corpus.
+
+        product_name, supplier and section_ids optionally restrict the search. A body shared by
+        several products yields one hit per product. Hits include their embedding for diversification.
+        """
+        keys = [
+            key for key in self.groups
+            if (product_name is None or key.split("\x1f")[0] == product_name)
+            and (supplier is None or key.split("\x1f")[1] == supplier)
+        ]
+        if not keys:
+            return []
+        entries = np.concatenate([np.arange(*self.groups[key]) for key in keys])
+        if section_ids:
+            entries = entries[np.isin(self.entry_sections[entries], section_ids)]
+        entry_rows = np.asarray(self.entry_rows[entries])
+        rows = np.unique(entry_rows)
+        if not len(rows):
+            return []
+
+        scores = self.score_rows(query_embedding, rows)
+        top = np.argsort(-scores)[:k]
+        rows, scores = rows[top], scores[top]
+        full_precision = rescore and self.full_vectors is not None
+        if full_precision:
+            scores = self.score_rows(query_embedding, rows, full_precision=True)
+        vectors = self.row_vectors(rows, full_precision)
+
+        position = {int(row): i for i, row in enumerate(rows)}
+        hits = []
+        for entry, row in zip(entries, entry_rows):
+            i = position.get(int(row))
+            if i is not None:
+                hits.append({
+                    "id": self.ids[row],
+                    "document": self.documents[row],
+                    "metadata": self.entry_metadatas[entry],
+                    "score": float(scores[i]),
+                    "embedding": vectors[i]
+                })
+        return hits
+
+
+if __name__ == "__main__":
+    from chroma_retrieval import get_collection, get_shard_router
+    from ingestion_journal import IngestionJournal
+
+    build_quantized_store(get_shard_router() or get_collection(), journal=IngestionJournal())
+    store = QuantizedVectorStore()
+
+    # Quick timing of a filtered query against a random group
+    some_group = next(iter(store.groups))
+    product_name, supplier = some_group.split("\x1f")
+    query_embedding = np.random.default_rng(0).standard_normal(store.dim).astype(np.float32)
+    start = time.perf_counter()
+    for _ in range(1000):
+        store.search(query_embedding, product_name, supplier, k=10)
+    print(f"Filtered search: {(time.perf_counter() - start) * 1000:.1f} us per query")
@@ -0,0 +1,255 @@
+# regulatory_index.py
+# Inverted index of the exact regulatory codes of every product: GHS hazard (H/EUH) and
+# precautionary (P) statements, CAS numbers and UN numbers, extracted from sections 2, 3
+# and 14 at ingestion. Postings are kept in a side table and loaded into memory as sets,
+# so exact-code lookups and boolean combinations ("H301 AND NOT UN2671") are set operations.
+
+import re
+import sqlite3
+import threading
+
+from ingestion_journal import journal_path
+
+INDEXED_SECTIONS = (2, 3, 14)
+
+# A statement code, or a combination such as P301+P310
+STATEMENT_PATTERN = re.compile(r"\b(?:EUH|H|P)\d{3}[A-Za-z]{0,2}(?:\s*\+\s*(?:EUH|H|P)\d{3}[A-Za-z]{0,2})*\b")
+CAS_PATTERN = re.compile(r"(?<![\d-])(\d{2,7})-(\d{2})-(\d)(?![\d-])")
+UN_PATTERN = re.compile(r"\bUN[\s-]*(?:No\.?|Number)?\s*[:#]?\s*(?:UN)?\s*(\d{4})\b", re.I)
+
+# Query tokens: parentheses, operators and codes (a CAS/UN prefix is allowed, e.g. "CAS 504-24-5" or "UN 2671")
+QUERY_TOKEN = re.compile(
+    r"\s*(\(|\)|&&|\|\||!|\bAND\b|\bOR\b|\bNOT\b|CAS[\s#:]*[\d-]+|UN[\s-]*\d{4}|[A-Za-z0-9+\-]+)", re.I
+)
+OPERATOR_TOKENS = {"&&": "AND", "||": "OR", "!": "NOT"}
+
+
+def valid_cas(number):
+    """Checks the check digit of a CAS registry number such as 504-24-5."""
+    digits = number.replace("-", "")
+    body, check = digits[:-1], int(digits[-1])
+    return sum(int(d) * i for i, d in enumerate(reversed(body), start=1)) % 10 == check
+
+
+def normalize_code(code):
+    """Returns the canonical form of a code, e.g. "h301" -> "H301", "CAS 504-24-5" -> "504-24-5", "un 2671" -> "UN2671".
+
+    Only the statement prefix is uppercased: the case of a suffix is significant (H360Fd is not H360FD).
+    """
+    code = re.sub(r"\s+", "", code)
+    code = re.sub(r"^CAS[#:]*", "", code, flags=re.I)
+    un = re.fullmatch(r"UN-?(\d{4})", code, re.I)
+    if un:
+        return f"UN{un.group(1)}"
+    return re.sub(r"\b(EUH|H|P)(?=\d{3})", lambda match: match.group(1).upper(), code, flags=re.I)
+
+
+def extract_codes(text):
+    """Extracts the canonical regulatory codes mentioned in a section text.
+
+    Combined statements are indexed both as written and per code, and variants such
+    as H360Fd also under their base code.
+    """
+    codes = set()
+    for match in STATEMENT_PATTERN.finditer(text):
+        parts = [normalize_code(part) for part in match.group(0).split("+")]
+        if len(parts) > 1:
+            codes.add("+".join(parts))
+        for part in parts:
+            codes.add(part)
+            codes.add(re.match(r"(?:EUH|H|P)\d{3}", part).group(0))
+    for match in CAS_PATTERN.finditer(text):
+        if valid_cas(match.group(0)):
+            codes.add(match.group(0))
+    for match in UN_PATTERN.finditer(text):
+        codes.add(f"UN{match.group(1)}")
+    return codes
+
+
+class RegulatoryIndex:
+    """Persistent code postings next to the ingestion journal, served from an in-memory inverted index."""
+
+    def __init__(self, path=journal_path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS regulatory_codes (
+                code TEXT NOT NULL,
+                product_name TEXT NOT NULL,
+                supplier TEXT NOT NULL,
+                section_id INTEGER NOT NULL,
+                PRIMARY KEY (code, product_name, supplier, section_id)
+            )
+        """)
+        self.conn.commit()
+        self.products = []
+        self.product_ids = {}
+        self.postings = {}
+        self.data_version = None
+        self.load()
+
+    def replace_section(self, product_name, supplier, section_id, codes):
+        """Replaces the codes of one section of a product. Call load() to serve them."""
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM regulatory_codes WHERE product_name = ? AND supplier = ? AND section_id = ?",
+                (product_name, supplier, int(section_id))
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO regulatory_codes (code, product_name, supplier, section_id) VALUES (?, ?, ?, ?)",
+                [(code, product_name, supplier, int(section_id)) for code in codes]
+            )
+            self.conn.commit()
+
+    def remove_product(self, product_name, supplier):
+        """Deletes every code of a product. Call load() to stop serving them."""
+        with self.lock:
+            self.conn.execute("DELETE FROM regulatory_codes WHERE product_name = ? AND supplier = ?", (product_name, supplier))
+            self.conn.commit()
+
+    def load(self):
+        """(Re)builds the in-memory postings from the table. The swap is atomic for readers."""
+        with self.lock:
+            self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            rows = self.conn.execute("SELECT code, product_name, supplier FROM regulatory_codes").fetchall()
+            all_products = self.conn.execute(
+                "SELECT DISTINCT product_name, supplier FROM sections"
+            ).fetchall() if self._has_table("sections") else []
+        products = sorted({(p, s) for _, p, s in rows} | set(all_products))
+        product_ids = {product: i for i, product in enumerate(products)}
+        postings = {}
+        for code, product_name, supplier in rows:
+            postings.setdefault(code, set()).add(product_ids[(product_name, supplier)])
+        self.products, self.product_ids = products, product_ids
+        self.postings = {code: frozenset(ids) for code, ids in postings.items()}
+
+    def reload_if_changed(self):
+        """Reloads the postings when another connection (e.g. a standalone ingestion daemon) committed
+        to the database since the last load. Returns True when it reloaded."""
+        with self.lock:
+            changed = self.conn.execute("PRAGMA data_version").fetchone()[0] != self.data_version
+        if changed:
+            self.load()
+        return changed
+
+    def _has_table(self, name):
+        return self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+    def lookup(self, code):
+        """Returns the ids of the products mentioning a code."""
+        return self.postings.get(normalize_code(code), frozenset())
+
+    def search(self, expression):
+        """Evaluates a boolean code query and returns the matching (product_name, supplier) pairs.
+
+        Terms are codes, combined with AND, OR, NOT (or &&, ||, !) and parentheses.
+        Adjacent terms without an operator are ANDed.
+        """
+        products, postings = self.products, self.postings
+        universe = frozenset(range(len(products)))
+        tokens = tokenize_query(expression)
+        position = 0
+
+        def peek():
+            return tokens[position] if position < len(tokens) else None
+
+        def take():
+            nonlocal position
+            position += 1
+            return tokens[position - 1]
+
+        def parse_or():
+            result = parse_and()
+            while peek() == "OR":
+                take()
+                result = result | parse_and()
+            return result
+
+        def parse_and():
+            result = parse_not()
+            while peek() not in (None, "OR", ")"):
+                if peek() == "AND":
+                    take()
+                result = result & parse_not()
+            return result
+
+        def parse_not():
+            if peek() == "NOT":
+                take()
+                return universe - parse_not()
+            return parse_term()
+
+        def parse_term():
+            token = peek()
+            if token is None:
+                raise ValueError("Unexpected end of query.")
+            take()
+            if token == "(":
+                result = parse_or()
+                if peek() != ")":
+                    raise ValueError("Missing closing parenthesis.")
+                take()
+                return result
+            if token in ("AND", "OR", ")"):
+                raise ValueError(f"Unexpected '{token}' in query.")
+            return postings.get(token, frozenset())
+
+        matches = parse_or()
+        if position != len(tokens):
+            raise ValueError(f"Unexpected '{tokens[position]}' in query.")
+        return [products[i] for i in sorted(matches)]
+
+    def matched_codes(self, product_name, supplier, codes):
+        """Returns which of codes a product mentions."""
+        product_id = self.product_ids.get((product_name, supplier))
+        return [code for code in codes if product_id in self.postings.get(code, ())]
+
+
+def tokenize_query(expression):
+    """Splits a boolean code query into operators, parentheses and canonical codes."""
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = QUERY_TOKEN.match(expression, position)
+        if not match:
+            raise ValueError(f"Invalid character in query at position {position}: '{expression[position]}'")
+        token = match.group(1)
+        upper = token.upper()
+        if upper in ("AND", "OR", "NOT", "(", ")"):
+            tokens.append(upper)
+        elif token in OPERATOR_TOKENS:
+            tokens.append(OPERATOR_TOKENS[token])
+        else:
+            tokens.append(normalize_code(token))
+        position = match.end()
+    if not tokens:
+        raise ValueError("Empty query.")
+    return tokens
+
+
+def index_regulatory_codes(df, index=None):
+    """Extracts the codes of sections 2, 3 and 14 of every processed row into the regulatory index."""
+    print("Indexing regulatory codes...")
+    index = index or RegulatoryIndex()
+    indexed = 0
+    for _, row in df.iterrows():
+        for section in row.get('processed_metadata', []):
+            metadata = section.get('metadata', {})
+            if metadata.get("section_id") not in INDEXED_SECTIONS:
+                continue
+            codes = extract_codes(section.get('page_content', '') or '')
+            index.replace_section(metadata["product_name"], metadata["supplier"], metadata["section_id"], codes)
+            indexed += len(codes)
+    index.load()
+    print(f"Regulatory code indexing complete. {indexed} code(s) across {len(index.products)} product(s), "
+          f"{len(index.postings)} distinct code(s).")
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from chroma_retrieval import generate_processed_metadata
+
+    index_regulatory_codes(generate_processed_metadata(pd.read_excel('df_with_metadata_2.xlsx')))
@@ -0,0 +1,185 @@
+# response_format.py
+# Compact /api/sds responses: field selection, content truncation, cursor-based pagination,
+# gzip/br content negotiation and a faster JSON encoder for Flask.
+
+import base64
+import gzip
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from werkzeug.exceptions import BadRequest, Conflict
+
+try:
+    import orjson
+except ImportError:  # The standard library encoder is used instead
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # Only gzip is offered
+    brotli = None
+
+# Top-level fields of a result; any metadata key (e.g. section_id) can be selected as well
+RESULT_FIELDS = ("content", "metadata")
+MAX_RESULT_LIMIT = 100
+COMPRESSION_MIN_BYTES = 1024  # Smaller bodies are not worth compressing
+RESULT_CACHE_SIZE = 256
+RESULT_CACHE_TTL = 300  # Seconds a result list stays available to cursors
+
+
+def parse_fields(value):
+    """Parses the comma-separated fields parameter, None meaning the full result."""
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(",") if field.strip()]
+    if not fields:
+        raise BadRequest("Invalid fields. Must be a comma-separated list of field names.")
+    return fields
+
+
+def parse_non_negative_int(value, name, default=None, maximum=None):
+    """Parses an optional non-negative integer query parameter."""
+    if value is None or value == "":
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise BadRequest(f"Invalid {name}. Must be a non-negative integer.")
+    if number < 0 or (maximum is not None and number > maximum):
+        raise BadRequest(f"Invalid {name}. Must be between 0 and {maximum}." if maximum else f"Invalid {name}. Must be >= 0.")
+    return number
+
+
+def format_result(content, metadata, fields=None, content_offset=0, max_content_chars=None):
+    """Formats one result, keeping only the selected fields and the requested slice of its content.
+
+    Selected metadata keys are returned at the top level of the result. Truncated content
+    reports its offset and total length, so the rest can be fetched with content_offset.
+    """
+    total_length = len(content)
+    if content_offset or max_content_chars is not None:
+        end = None if max_content_chars is None else content_offset + max_content_chars
+        content = content[content_offset:end]
+
+    result = {}
+    for field in fields or RESULT_FIELDS:
+        if field == "content":
+            result["content"] = content
+        elif field == "metadata":
+            result["metadata"] = metadata
+        elif field in metadata:
+            result[field] = metadata[field]
+    if "content" in result and len(content) < total_length:
+        result["content_offset"] = content_offset
+        result["content_length"] = total_length
+        result["truncated"] = content_offset + len(content) < total_length
+    return result
+
+
+def request_fingerprint(params):
+    """Identifies the retrieval behind a response, ignoring presentation-only parameters."""
+    presentation = {"cursor", "limit", "fields", "max_content_chars", "content_offset"}
+    retrieval = sorted((key, value) for key, value in params.items(multi=True) if key not in presentation)
+    return hashlib.sha1(json.dumps(retrieval).encode("utf8")).hexdigest()[:16]
+
+
+def result_list_digest(metadatas):
+    """Identifies a result list by the sections it contains, in order."""
+    identity = json.dumps([sorted(metadata.items()) for metadata in metadatas], default=str)
+    return hashlib.sha1(identity.encode("utf8")).hexdigest()[:16]
+
+
+def encode_cursor(fingerprint, offset, results_digest):
+    """Builds the opaque cursor pointing at offset in the result list identified by results_digest."""
+    cursor = f"{fingerprint}:{results_digest}:{offset}"
+    return base64.urlsafe_b64encode(cursor.encode("utf8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, fingerprint):
+    """Returns the offset and result list digest stored in a cursor, checking it belongs to the same query."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cursor_fingerprint, results_digest, offset = base64.urlsafe_b64decode(padded).decode("utf8").split(":")
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise BadRequest("Invalid cursor.")
+    if cursor_fingerprint != fingerprint or offset < 0:
+        raise BadRequest("Cursor does not match this query. Repeat the original query parameters with the cursor.")
+    return offset, results_digest
+
+
+def check_cursor_results(results_digest, metadatas):
+    """Raises 409 when the result list behind a cursor changed, e.g. after a re-ingestion or
+    when the page is served by another worker whose compression kept other sections."""
+    if result_list_digest(metadatas) != results_digest:
+        raise Conflict("The results of this query changed since the cursor was issued. Repeat the query without a cursor.")
+
+
+class ResultCache:
+    """Small in-process LRU of result lists, so that following a cursor usually does not redo retrieval
+    and compression. Each worker process has its own: on a miss the list is recomputed."""
+
+    def __init__(self, size=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                self.entries.pop(key, None)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+def compress_response(request, response):
+    """Compresses a JSON response with br or gzip, depending on what the client accepts."""
+    if (response.direct_passthrough or response.mimetype != "application/json"
+            or "Content-Encoding" in response.headers):
+        return response
+    data = response.get_data()
+    if len(data) < COMPRESSION_MIN_BYTES:
+        return response
+
+    if brotli is not None and request.accept_encodings["br"]:
+        data, encoding = brotli.compress(data, quality=5), "br"
+    elif request.accept_encodings["gzip"]:
+        data, encoding = gzip.compress(data, compresslevel=5), "gzip"
+    else:
+        return response
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    response.headers["Content-Length"] = str(len(data))
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def install_json_provider(app):
+    """Serializes Flask JSON responses with orjson when it is installed."""
+    if orjson is None:
+        return
+    from flask.json.provider import DefaultJSONProvider
+
+    class OrjsonProvider(DefaultJSONProvider):
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(
+                obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS, default=self.default
+            ).decode("utf8")
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+    app.json = OrjsonProvider(app)
@@ -0,0 +1,380 @@
+# sds_properties.py
+# Structured extraction of numeric SDS properties into a typed, queryable table:
+# section 9 (physical and chemical properties), the acute toxicity values of section 11
+# and the transport identifiers of section 14. Units are normalized so that range
+# lookups such as "flash point < 60 °C" run directly against an index.
+#
+# A value is stored as the interval [value, value_max]. Stated bounds such as "> 5000 mg/kg"
+# or "< 1,0" leave the other end open (NULL) and keep their operator in value_op/value_max_op.
+
+import re
+import sqlite3
+import threading
+
+from ingestion_journal import journal_path
+
+# Property name -> section, label pattern, kind of value and canonical unit
+PROPERTY_SPECS = {
+    "flash_point": (9, r"flash\s*point", "temperature", "°C"),
+    "boiling_point": (9, r"(?:initial\s+)?boiling\s*point(?:\s*/\s*range)?(?:\s+and\s+boiling\s+range)?", "temperature", "°C"),
+    "melting_point": (9, r"melting\s*point(?:\s*/\s*(?:range|freezing\s*point))?", "temperature", "°C"),
+    "autoignition_temperature": (9, r"auto-?\s*ignition\s*temperature", "temperature", "°C"),
+    "decomposition_temperature": (9, r"decomposition\s*temperature", "temperature", "°C"),
+    "ph": (9, r"\bpH\b(?:\s*\([^)]*\))?", "number", None),
+    "vapour_pressure": (9, r"vapou?r\s*pressure", "pressure", "kPa"),
+    "vapour_density": (9, r"vapou?r\s*density(?:\s*\(air\s*=\s*1\))?", "number", None),
+    "relative_density": (9, r"(?:relative\s*density|specific\s*gravity)(?:\s*\(water\s*=\s*1\))?", "number", None),
+    "density": (9, r"(?<!relative )(?<!vapor )(?<!vapour )\bdensity", "density", "g/cm3"),
+    "log_kow": (9, r"(?:log\s*kow|log\s*pow|partition\s*coefficient)[^:]{0,40}", "number", None),
+    "molecular_weight": (9, r"molecular\s*weight", "number", "g/mol"),
+    # Also the RTECS notation, e.g. "orl-rat LD50:375 mg/kg"
+    "ld50_oral": (11, r"(?:oral|\borl-\w+)\s*LD\s*50|LD\s*50[^:=,.]{0,30}oral", "toxicity", "mg/kg"),
+    "ld50_dermal": (11, r"(?:dermal|\bskn-\w+)\s*LD\s*50|LD\s*50[^:=,.]{0,30}dermal", "toxicity", "mg/kg"),
+    "lc50_inhalation": (11, r"(?:inhalation|\bihl-\w+)\s*LC\s*50|LC\s*50[^:=,.]{0,30}inhalation", "toxicity", "mg/L"),
+    "un_number": (14, r"UN[\s-]*(?:No\.?|Number)?", "un_number", None),
+    "transport_hazard_class": (14, r"(?:transport\s+)?hazard\s*class(?:\(es\))?|class\s+or\s+division", "number", None),
+    "packing_group": (14, r"packing\s*group", "packing_group", None),
+}
+
+# Names accepted in query expressions, e.g. "vapor pressure" or "flashpoint"
+PROPERTY_ALIASES = {
+    "flashpoint": "flash_point", "bp": "boiling_point", "mp": "melting_point", "freezing_point": "melting_point",
+    "vapor_pressure": "vapour_pressure", "vapor_density": "vapour_density", "specific_gravity": "relative_density",
+    "autoignition": "autoignition_temperature", "auto_ignition_temperature": "autoignition_temperature",
+    "oral_ld50": "ld50_oral", "dermal_ld50": "ld50_dermal", "inhalation_lc50": "lc50_inhalation",
+    "un": "un_number", "hazard_class": "transport_hazard_class", "class": "transport_hazard_class",
+    "log_pow": "log_kow", "mw": "molecular_weight",
+}
+
+# Unit conversions to the canonical unit of each kind
+TEMPERATURE_UNITS = {"C": lambda v: v, "F": lambda v: (v - 32) * 5 / 9, "K": lambda v: v - 273.15}
+PRESSURE_UNITS = {"kpa": 1.0, "pa": 0.001, "hpa": 0.1, "mbar": 0.1, "bar": 100.0, "atm": 101.325,
+                  "mmhg": 0.133322, "torr": 0.133322, "psi": 6.89476}
+DENSITY_UNITS = {"g/cm3": 1.0, "g/ml": 1.0, "kg/m3": 0.001, "kg/l": 1.0, "g/l": 0.001}
+TOXICITY_UNITS = {"mg/kg": 1.0, "g/kg": 1000.0, "ug/kg": 0.001, "µg/kg": 0.001,
+                  "mg/l": 1.0, "g/l": 1000.0, "mg/m3": 0.001, "ppm": None}
+
+# Unit spellings accepted after a value, per kind of value
+UNIT_PATTERNS = {
+    "temperature": r"°?\s*([CFK])\b",
+    "pressure": r"(mm\s*hg|torr|hpa|kpa|mbar|bar|atm|psi|pa)\b",
+    "density": r"(g\s*/\s*cm\s*[3³]|g\s*/\s*ml|kg\s*/\s*m\s*[3³]|kg\s*/\s*l|g\s*/\s*l)",
+    "toxicity": r"(mg\s*/\s*kg|g\s*/\s*kg|[uµ]g\s*/\s*kg|mg\s*/\s*l|g\s*/\s*l|mg\s*/\s*m\s*3|ppm)",
+}
+
+# Thousands separators ("2,900"), a decimal point or comma ("0,53") or a leading-dot decimal (".13")
+NUMBER = r"-?(?:\d{1,3}(?:,\d{3})+(?![\d,])|\d+(?:\.\d+|,\d{1,2}(?!\d))?|\.\d+)"
+BOUND_OPERATOR = r"(?:<=|>=|<|>)"
+# A value, bound ("> 5000") or range ("158-164", "> 2.00 - < 3.00")
+RANGE_PATTERN = re.compile(
+    rf"(?:({BOUND_OPERATOR})\s*)?({NUMBER})(?:\s*(?:-|–|to)\s*(?:({BOUND_OPERATOR})\s*)?({NUMBER}))?"
+)
+# Test species of toxicity values, as words or RTECS codes ("orl-rat", "orl-bwd")
+SPECIES_PATTERNS = {
+    "rat": r"\brats?\b", "mouse": r"\bmouse\b|\bmice\b|-mus\b", "rabbit": r"\brabbits?\b|-rbt\b",
+    "guinea pig": r"guinea\s*pigs?|-gpg\b", "dog": r"\bdogs?\b", "cat": r"\bcats?\b",
+    "bird": r"\bbirds?\b|-bwd\b|-brd\b", "quail": r"\bquail\b|-qal\b", "duck": r"\bducks?\b|-dck\b",
+    "human": r"\bhuman\b|\bman\b|-hmn\b|-man\b|-wmn\b", "fish": r"\bfish\b|\btrout\b",
+}
+MISSING_VALUE = re.compile(
+    r"not\s+(?:available|applicable|determined|established|relevant|flammable)|does\s+not\s+flash|non-?flammable"
+    r"|no\s+(?:data|information)|n/a|none", re.I
+)
+# Words allowed between a label and its value, e.g. "Flash point: approx. 62 °C"
+APPROXIMATION = r"(?:approx(?:imately|imate|\.)?|ca\.|about|~)"
+# Sub-labels between a label and its value, e.g. "Boiling point/boiling range: 212 °F" or "log Pow: 0.63"
+SUB_LABEL = re.compile(r"\s*[A-Za-z/(][^:=\d,;.<>]{0,40}[:=]\s*")
+# The value of a label ends where the next "Label:" starts, or at the next known label
+NEXT_LABEL = re.compile(r"[,.;]\s*[A-Za-z][A-Za-z /()\-]{1,40}:")
+KNOWN_LABELS = re.compile("|".join(f"(?:{spec[1]})" for spec in PROPERTY_SPECS.values()), re.I)
+OPERATORS = {"<": "<", "<=": "<=", ">": ">", ">=": ">=", "=": "=", "==": "="}
+EXPRESSION_PATTERN = re.compile(
+    rf"^\s*(?P<name>[a-z][a-z0-9 ()/_-]*?)\s*(?P<op><=|>=|==|=|<|>)\s*(?P<value>{NUMBER})\s*(?P<unit>\S.*)?$", re.I
+)
+
+
+def clean_text(text):
+    """Repairs the degree signs mangled by the PDF/Excel round trip and normalizes them."""
+    for broken, fixed in (("â„ƒ", "°C"), ("â„‰", "°F"), ("℃", "°C"), ("℉", "°F"), ("Â°", "°"), ("Âº", "°"), ("º", "°"),
+                          ("≥", ">="), ("≤", "<="), ("&gt;", ">"), ("&lt;", "<")):
+        text = text.replace(broken, fixed)
+    return re.sub(r"°\s*°", "°", text)
+
+
+def to_float(number):
+    if re.fullmatch(r"-?\d{1,3}(?:,\d{3})+", number):
+        return float(number.replace(",", ""))
+    return float(number.replace(",", "."))
+
+
+def value_window(text, match, kind, width=120):
+    """Returns the qualifier following a label and the value text after it, up to the next label."""
+    window = text[match.end():match.end() + width]
+    # Toxicity labels carry the species and duration before the value, e.g. "- Rat - 4 h = 0,53 mg/l"
+    qualifier = r"[^:=<>]{0,40}(?:[:=]|(?=[<>]))" if kind == "toxicity" else r"\s*(?:\([^)]*\))?\s*[:=]?"
+    prefix = re.match(rf"{qualifier}\s*", window)
+    start = prefix.end() if prefix else 0
+    if kind not in ("toxicity", "packing_group"):
+        # "does not flash, pH:" or "not flammable Decomposition Temperature:" are not sub-labels
+        for _ in range(3):
+            sub_label = SUB_LABEL.match(window, start)
+            if not sub_label or MISSING_VALUE.search(sub_label.group(0)):
+                break
+            start = sub_label.end()
+    prefix, window = window[:start], window[start:]
+    ends = [match.start() for match in (NEXT_LABEL.search(window), KNOWN_LABELS.search(window, 1)) if match]
+    return prefix, (window[:min(ends)] if ends else window)
+
+
+def parse_value(kind, window):
+    """Parses a label's value text into a dict with value, value_max, unit, value_op and value_max_op, or None.
+
+    "> 5000 mg/kg" gives value 5000 with value_op ">" and no value_max, "< 1,0" gives
+    value_max 1.0 with value_max_op "<" and no value.
+    """
+    if kind == "packing_group":
+        group = re.match(r"\s*(III|II|I)\b", window)
+        return {"value": float(len(group.group(1))), "value_max": None, "unit": None,
+                "value_op": None, "value_max_op": None} if group else None
+    if kind == "toxicity":
+        # Toxicity values may follow the species and duration, e.g. "- Rat - female - 730 mg/kg"
+        first_number = RANGE_PATTERN.search(window)
+        missing = MISSING_VALUE.search(window)
+        if not first_number or (missing and missing.start() < first_number.start()):
+            return None
+    else:
+        # Other values come right after their label: "does not flash, pH: 3 - 4" has no flash point
+        window = window[re.match(rf"\s*(?:{APPROXIMATION}\s*)?", window, re.I).end():]
+        window = re.sub(rf"^((?:{BOUND_OPERATOR})?\s*)-\s+(?=[\d.])", r"\1-", window)  # "- 40 °F", "<=- 20"
+        first_number = RANGE_PATTERN.match(window)
+        if not first_number:
+            return None
+    low_op, low, high_op, high = first_number.groups()
+    low = to_float(low)
+    high = to_float(high) if high else None
+    if high is not None and high < low and not high_op:  # "5-10" read as 5 and -10
+        high = abs(high)
+    after = window[first_number.end():first_number.end() + 20]
+    unit = re.match(r"\s*" + UNIT_PATTERNS[kind], after, re.I) if kind in UNIT_PATTERNS else None
+
+    if kind == "temperature":
+        to_celsius = TEMPERATURE_UNITS[unit.group(1).upper() if unit else "C"]
+        convert, canonical = (lambda v: round(to_celsius(v), 2)), "°C"
+    elif kind == "pressure":
+        if not unit:
+            return None
+        factor = PRESSURE_UNITS[re.sub(r"\s", "", unit.group(1).lower())]
+        convert, canonical = (lambda v: round(v * factor, 6)), "kPa"
+    elif kind == "density":
+        key = re.sub(r"\s", "", unit.group(1).lower()).replace("³", "3") if unit else "g/cm3"
+        factor = DENSITY_UNITS[key]
+        convert, canonical = (lambda v: v * factor), "g/cm3"
+    elif kind == "toxicity":
+        if not unit:
+            return None
+        key = re.sub(r"\s", "", unit.group(1).lower())
+        factor = TOXICITY_UNITS[key]
+        if factor is None:
+            convert, canonical = (lambda v: v), key
+        else:
+            convert, canonical = (lambda v: v * factor), "mg/kg" if key.endswith("/kg") else "mg/L"
+    else:
+        convert, canonical = (lambda v: v), None
+
+    # A single "<" or "<=" bound is an upper bound; a lower bound leaves value_max open
+    if high is None and low_op in ("<", "<="):
+        return {"value": None, "value_max": convert(low), "unit": canonical, "value_op": None, "value_max_op": low_op}
+    return {
+        "value": convert(low),
+        "value_max": convert(high) if high is not None else None,
+        "unit": canonical,
+        "value_op": low_op if low_op in (">", ">=") else None,
+        "value_max_op": high_op if high is not None and high_op in ("<", "<=") else None
+    }
+
+
+def find_species(text):
+    """Returns the test species named in a toxicity label or value, e.g. "rat" for "LD50 (Rat, male)", or None."""
+    found = []
+    for species, pattern in SPECIES_PATTERNS.items():
+        match = re.search(pattern, text, re.I)
+        if match:
+            found.append((match.start(), species))
+    return min(found)[1] if found else None
+
+
+def extract_properties(section_id, text):
+    """Extracts every known property of one section as dicts with value, value_max, unit and raw text."""
+    text = clean_text(text)
+    properties = []
+    for name, (spec_section, label, kind, _unit) in PROPERTY_SPECS.items():
+        if spec_section != section_id:
+            continue
+        for match in re.finditer(label, text, re.I):
+            species = None
+            if kind == "un_number":
+                number = re.match(r"\s*[:.]?\s*(?:UN)?\s*(\d{4})\b", text[match.end():match.end() + 20])
+                parsed = {"value": float(number.group(1)), "value_max": None, "unit": None,
+                          "value_op": None, "value_max_op": None} if number else None
+                raw = match.group(0) + (number.group(0) if number else "")
+            else:
+                qualifier, window = value_window(text, match, kind)
+                parsed = parse_value(kind, window)
+                raw = f"{match.group(0)}: {window.strip()}"
+                if kind == "toxicity":
+                    # The species is named in the label, before the value or right after it, e.g. "510 mg/kg (Rat)"
+                    value_text = re.split(r"[,;.]\s", window, maxsplit=1)[0][:60]
+                    species = find_species(f"{match.group(0)} {qualifier} {value_text}")
+            if parsed:
+                properties.append({"property": name, **parsed, "species": species, "raw": raw.strip()[:200]})
+                # Physical properties take the first value, toxicity keeps one row per test
+                if kind != "toxicity":
+                    break
+    return properties
+
+
+class PropertyStore:
+    """Typed property table next to the ingestion journal, indexed for exact and range lookups."""
+
+    def __init__(self, path=journal_path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(sds_properties)")]
+        if columns and "species" not in columns:
+            # The table is derived from the section texts: re-run `python sds_properties.py` to refill it
+            print("Property table predates open bounds and species, recreating it.")
+            self.conn.execute("DROP TABLE sds_properties")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS sds_properties (
+                product_name TEXT NOT NULL,
+                supplier TEXT NOT NULL,
+                section_id INTEGER NOT NULL,
+                property TEXT NOT NULL,
+                value REAL,
+                value_max REAL,
+                value_op TEXT,
+                value_max_op TEXT,
+                unit TEXT,
+                species TEXT,
+                raw TEXT
+            )
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS properties_by_value ON sds_properties (property, value)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS properties_by_product ON sds_properties (product_name, supplier)")
+        self.conn.commit()
+
+    def replace_section(self, product_name, supplier, section_id, properties):
+        """Replaces the properties extracted from one section of a product."""
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM sds_properties WHERE product_name = ? AND supplier = ? AND section_id = ?",
+                (product_name, supplier, int(section_id))
+            )
+            self.conn.executemany("""
+                INSERT INTO sds_properties
+                (product_name, supplier, section_id, property, value, value_max, value_op, value_max_op, unit, species, raw)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (product_name, supplier, int(section_id), p["property"], p["value"], p["value_max"],
+                 p.get("value_op"), p.get("value_max_op"), p["unit"], p.get("species"), p["raw"])
+                for p in properties
+            ])
+            self.conn.commit()
+
+    def remove_product(self, product_name, supplier):
+        """Deletes every property of a product, e.g. after its file was re-ingested under another name."""
+        with self.lock:
+            self.conn.execute("DELETE FROM sds_properties WHERE product_name = ? AND supplier = ?", (product_name, supplier))
+            self.conn.commit()
+
+    def query(self, property_name=None, minimum=None, maximum=None, equals=None, product_name=None, supplier=None,
+              species=None, exclusive_min=False, exclusive_max=False, limit=1000):
+        """Looks up property rows by exact value or range, optionally for one product/supplier or test species.
+
+        A row matches when its interval overlaps the requested one: "> 5000 mg/kg" matches
+        "ld50 oral >= 2000" but not "ld50 oral <= 5000".
+        """
+        keys = ("product_name", "supplier", "section_id", "property", "value", "value_max", "value_op", "value_max_op",
+                "unit", "species", "raw")
+        query = f"SELECT {', '.join(keys)} FROM sds_properties WHERE 1 = 1"
+        params = []
+        for column, value in (("property", property_name), ("product_name", product_name), ("supplier", supplier),
+                              ("species", species)):
+            if value is not None:
+                query += f" AND {column} = ?"
+                params.append(value)
+        # Upper end of a row's interval: NULL when open above ("> 5000"), value for a single value
+        upper = "(CASE WHEN value_max IS NOT NULL THEN value_max WHEN value_op IS NULL THEN value END)"
+        if equals is not None:
+            # A range value matches when it contains the requested value
+            query += (f" AND (value IS NULL OR value < ? OR (value = ? AND value_op IS NOT '>'))"
+                      f" AND ({upper} IS NULL OR {upper} > ? OR ({upper} = ? AND value_max_op IS NOT '<'))")
+            params.extend([equals] * 4)
+        if minimum is not None:
+            bound = "" if exclusive_min else f" OR ({upper} = ? AND value_max_op IS NOT '<')"
+            query += f" AND ({upper} IS NULL OR {upper} > ?{bound})"
+            params.extend([minimum] if exclusive_min else [minimum, minimum])
+        if maximum is not None:
+            bound = "" if exclusive_max else " OR (value = ? AND value_op IS NOT '>')"
+            query += f" AND (value IS NULL OR value < ?{bound})"
+            params.extend([maximum] if exclusive_max else [maximum, maximum])
+        with self.lock:
+            rows = self.conn.execute(
+                query + " ORDER BY property, COALESCE(value, value_max) LIMIT ?", params + [limit]
+            ).fetchall()
+        return [dict(zip(keys, row)) for row in rows]
+
+
+def resolve_property(name):
+    """Maps a user-facing property name to its canonical name, or None."""
+    key = re.sub(r"[\s/-]+", "_", name.strip().lower()).strip("_")
+    key = PROPERTY_ALIASES.get(key, key)
+    return key if key in PROPERTY_SPECS else None
+
+
+def convert_query_value(property_name, value, unit):
+    """Converts a query value given in unit to the canonical unit of the property."""
+    if not unit:
+        return value
+    kind = PROPERTY_SPECS[property_name][2]
+    if kind not in UNIT_PATTERNS or not re.fullmatch(UNIT_PATTERNS[kind], unit, re.I):
+        raise ValueError(f"Unsupported unit '{unit}' for {property_name}")
+    return parse_value(kind, f"{value} {unit}")["value"]
+
+
+def parse_expression(expression):
+    """Parses "flash point < 60 °C" into (property, operator, value in the canonical unit)."""
+    match = EXPRESSION_PATTERN.match(clean_text(expression))
+    if not match:
+        raise ValueError(f"Invalid property expression '{expression}'. Expected e.g. 'flash point < 60 °C'.")
+    property_name = resolve_property(match.group("name"))
+    if property_name is None:
+        raise ValueError(f"Unknown property '{match.group('name')}'. Known properties: {', '.join(PROPERTY_SPECS)}")
+    value = convert_query_value(property_name, to_float(match.group("value")), (match.group("unit") or "").strip())
+    return property_name, OPERATORS[match.group("op")], value
+
+
+def index_sds_properties(df, store=None):
+    """Extracts the properties of sections 9, 11 and 14 of every processed row into the property table."""
+    print("Extracting structured SDS properties...")
+    store = store or PropertyStore()
+    sections = {spec[0] for spec in PROPERTY_SPECS.values()}
+    extracted = 0
+    for _, row in df.iterrows():
+        for section in row.get('processed_metadata', []):
+            metadata = section.get('metadata', {})
+            if metadata.get("section_id") not in sections:
+                continue
+            properties = extract_properties(metadata["section_id"], section.get('page_content', '') or '')
+            store.replace_section(metadata["product_name"], metadata["supplier"], metadata["section_id"], properties)
+            extracted += len(properties)
+    print(f"Property extraction complete. {extracted} value(s) indexed.")
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from chroma_retrieval import generate_processed_metadata
+
+    index_sds_properties(generate_processed_metadata(pd.read_excel('df_with_metadata_2.xlsx')))
@@ -0,0 +1,250 @@
+# section_digests.py
+# Offline enrichment of SDS sections into short per-facet digests (GHS classification, PPE,
+# flash point, UN number, first aid). Digests are computed once per (product, supplier,
+# section) after ingestion and stored in a side table, so that /api/sds can answer the
+# common questions without a query-time LLM call.
+
+import re
+import sqlite3
+import threading
+import time
+
+from ingestion_journal import journal_path
+
+# Facets answered from digests: the sections they come from, the query keywords that
+# select them and what the LLM is asked to extract. Keywords are matched longest first, so
+# "transport hazard class" selects un_number and never ghs_classification.
+DIGEST_FACETS = {
+    "ghs_classification": {
+        "sections": [2],
+        "keywords": ["ghs", "ghs classification", "hazard classification", "hazard class", "signal word",
+                     "hazard statement", "pictogram"],
+        "extract": "the GHS classification: hazard classes and categories, signal word, hazard statements (H-codes) and pictograms"
+    },
+    "ppe": {
+        "sections": [8],
+        "keywords": ["ppe", "personal protective", "protective equipment", "gloves", "respirator", "eye protection", "goggles"],
+        "extract": "the personal protective equipment: eye/face, hand, skin/body and respiratory protection"
+    },
+    "flash_point": {
+        "sections": [9],
+        "keywords": ["flash point", "flashpoint"],
+        "extract": "the flash point, with its unit and test method if given"
+    },
+    "un_number": {
+        "sections": [14],
+        "keywords": ["un number", "un no", "un-number", "un#", "un proper shipping name", "proper shipping name",
+                     "transport class", "transport hazard class", "packing group"],
+        "extract": "the UN number, proper shipping name, transport hazard class and packing group"
+    },
+    "first_aid": {
+        "sections": [4],
+        "keywords": ["first aid", "first-aid", "if inhaled", "skin contact", "eye contact"],
+        "extract": "the first aid measures for inhalation, skin contact, eye contact and ingestion"
+    }
+}
+
+DIGEST_PROMPT = (
+    "From the following Safety Data Sheet section, extract {extract}. "
+    "Answer in at most 5 short lines, using only facts stated in the text. "
+    "If the information is not in the text, answer exactly: NOT FOUND\n\n"
+    "Section text:\n{text}\n\nAnswer:"
+)
+NOT_FOUND = "NOT FOUND"
+
+# Words a facet question may contain besides its keywords, e.g. "What is the flash point of this product?"
+FILLER_WORDS = {
+    "a", "an", "and", "any", "are", "as", "be", "by", "can", "do", "does", "for", "from", "give", "has", "have",
+    "how", "i", "in", "info", "information", "is", "it", "its", "list", "me", "measures", "needed", "of", "on",
+    "please", "product", "required", "sds", "should", "show", "tell", "the", "this", "to", "use", "what",
+    "which", "with"
+}
+FACET_KEYWORDS = sorted(
+    ((keyword, facet) for facet, spec in DIGEST_FACETS.items() for keyword in spec["keywords"]),
+    key=lambda item: -len(item[0])
+)
+
+
+def normalize_query(text):
+    return " ".join(re.findall(r"[a-z0-9#-]+", text.lower()))
+
+
+def match_facets(query, ignored_words=()):
+    """Returns the digest facets a query asks about, or [] when it asks about anything else.
+
+    A query is only answered from digests when nothing but facet keywords, filler words and
+    ignored_words (e.g. the product name) remains, so "flash point and boiling point" or
+    "LC50 for inhalation" go through retrieval.
+    """
+    remaining = f" {normalize_query(query)} "
+    facets = []
+    for keyword, facet in FACET_KEYWORDS:
+        pattern = rf"(?<![a-z0-9]){re.escape(keyword)}s?(?![a-z0-9])"
+        remaining, count = re.subn(pattern, " ", remaining)
+        if count and facet not in facets:
+            facets.append(facet)
+    leftover = set(remaining.split()) - FILLER_WORDS - set(ignored_words)
+    return [] if leftover else facets
+
+
+def is_not_found(digest):
+    """True for the digest answer meaning the section lacks the facet, e.g. "NOT FOUND." or "Not found"."""
+    return re.sub(r"[^A-Z ]", "", digest.upper()).strip() == NOT_FOUND
+
+
+class DigestStore:
+    """Side table of per-facet section digests, kept next to the ingestion journal."""
+
+    def __init__(self, path=journal_path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS section_digests (
+                product_name TEXT NOT NULL,
+                supplier TEXT NOT NULL,
+                section_id INTEGER NOT NULL,
+                facet TEXT NOT NULL,
+                digest TEXT NOT NULL,
+                source_hash TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (product_name, supplier, facet)
+            )
+        """)
+        self.conn.commit()
+
+    def get(self, product_name, supplier, facet):
+        """Returns the digest row of a facet as a dict, or None."""
+        with self.lock:
+            row = self.conn.execute("""
+                SELECT section_id, digest, source_hash FROM section_digests
+                WHERE product_name = ? AND supplier = ? AND facet = ?
+            """, (product_name, supplier, facet)).fetchone()
+        return dict(zip(("section_id", "digest", "source_hash"), row)) if row else None
+
+    def is_current(self, product_name, supplier, section_id, source_hash):
+        """False when the journal shows the section was re-ingested with another body, or emptied, since
+        the digest was computed. Sections ingested without a journal or deduplication are trusted."""
+        with self.lock:
+            if not self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sections'").fetchone():
+                return True
+            rows = self.conn.execute(
+                "SELECT status, content_hash FROM sections WHERE product_name = ? AND supplier = ? AND section_id = ?",
+                (product_name, supplier, int(section_id))
+            ).fetchall()
+        stored = [content_hash for status, content_hash in rows if status == "done"]
+        return not rows or None in stored or source_hash in stored
+
+    def invalidate(self, product_name, supplier, section_id=None, keep_hash=None):
+        """Deletes the digests of a product (or of one of its sections) not computed from the body keep_hash."""
+        query = "DELETE FROM section_digests WHERE product_name = ? AND supplier = ? AND source_hash IS NOT ?"
+        params = [product_name, supplier, keep_hash]
+        if section_id is not None:
+            query += " AND section_id = ?"
+            params.append(int(section_id))
+        with self.lock:
+            self.conn.execute(query, params)
+            self.conn.commit()
+
+    def digest_for_source(self, source_hash, facet):
+        """Returns a digest already computed for the same section body, or None."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT digest FROM section_digests WHERE source_hash = ? AND facet = ? LIMIT 1", (source_hash, facet)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, product_name, supplier, section_id, facet, digest, source_hash):
+        with self.lock:
+            self.conn.execute("""
+                INSERT OR REPLACE INTO section_digests
+                (product_name, supplier, section_id, facet, digest, source_hash, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (product_name, supplier, int(section_id), facet, digest, source_hash, time.time()))
+            self.conn.commit()
+
+    def lookup(self, query, product_name, supplier, section_ids=None):
+        """Answers a query from digests when every facet it asks about has a usable digest.
+
+        Returns a list of {"facet", "section_id", "digest"} dicts, or None when the query
+        needs the regular retrieval path.
+        """
+        facets = match_facets(query, normalize_query(f"{product_name} {supplier}").split())
+        # A facet outside the requested sections would go unanswered
+        if not facets or section_ids and any(not set(DIGEST_FACETS[f]["sections"]) & set(section_ids) for f in facets):
+            return None
+        answers = []
+        for facet in facets:
+            row = self.get(product_name, supplier, facet)
+            if row is None or is_not_found(row["digest"]):
+                return None
+            if not self.is_current(product_name, supplier, row["section_id"], row["source_hash"]):
+                return None
+            answers.append({"facet": facet, "section_id": row["section_id"], "digest": row["digest"]})
+        return answers
+
+
+def iter_section_texts(collection, journal=None):
+    """Yields (product_name, supplier, section_id, source_hash, text) for every stored digest section."""
+    from chroma_retrieval import content_hash
+
+    digest_sections = sorted({s for spec in DIGEST_FACETS.values() for s in spec["sections"]})
+    refs = journal.section_refs(section_ids=digest_sections) if journal is not None else []
+    if refs:
+        # Deduplicated bodies: fetch each shared body once
+        hashes = sorted({ref["content_hash"] for ref in refs})
+        bodies = collection.get(ids=hashes, include=["documents"])
+        text_by_hash = dict(zip(bodies["ids"], bodies["documents"]))
+        for ref in refs:
+            if ref["content_hash"] in text_by_hash:
+                yield ref["product_name"], ref["supplier"], ref["section_id"], ref["content_hash"], text_by_hash[ref["content_hash"]]
+        return
+
+    records = collection.get(where={"section_id": {"$in": digest_sections}}, include=["documents", "metadatas"])
+    for text, metadata in zip(records["documents"], records["metadatas"]):
+        yield metadata["product_name"], metadata["supplier"], metadata["section_id"], content_hash(text), text
+
+
+def enrich_section_digests(collection, journal=None, store=None, llm=None):
+    """Computes the missing or outdated digests of every stored product.
+
+    A digest is recomputed only when its section body changed, and a body shared by
+    several products is summarized once.
+    """
+    print("Enriching SDS sections with facet digests...")
+    store = store or DigestStore()
+    if llm is None:
+        from langchain_openai import OpenAI
+        llm = OpenAI(temperature=0)
+
+    computed, reused, unchanged, failed = 0, 0, 0, 0
+    for product_name, supplier, section_id, source_hash, text in iter_section_texts(collection, journal):
+        for facet, spec in DIGEST_FACETS.items():
+            if section_id not in spec["sections"]:
+                continue
+            existing = store.get(product_name, supplier, facet)
+            if existing and existing["source_hash"] == source_hash:
+                unchanged += 1
+                continue
+            digest = store.digest_for_source(source_hash, facet)
+            if digest is not None:
+                reused += 1
+            else:
+                try:
+                    digest = llm.invoke(DIGEST_PROMPT.format(extract=spec["extract"], text=text)).strip()
+                    computed += 1
+                except Exception as e:
+                    print(f"Failed to compute '{facet}' digest for {product_name} ({supplier}): {e}")
+                    failed += 1
+                    continue
+            store.put(product_name, supplier, section_id, facet, digest, source_hash)
+
+    print(f"Digest enrichment complete. Computed: {computed}, Reused: {reused}, Unchanged: {unchanged}, Failures: {failed}")
+
+
+if __name__ == "__main__":
+    from chroma_retrieval import get_collection, get_shard_router
+    from ingestion_journal import IngestionJournal
+
+    enrich_section_digests(get_shard_router() or get_collection(), IngestionJournal())
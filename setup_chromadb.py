@@ -1,24 +1,21 @@
 import os
 import pandas as pd
-import chromadb
-from chroma_retrieval import get_embeddings, generate_processed_metadata, store_sds_documents_to_chromadb
+from chroma_retrieval import get_collection, get_shard_router, get_embeddings, generate_processed_metadata, store_sds_documents_to_chromadb
+from quantized_store import build_quantized_store
+from ingestion_journal import IngestionJournal
+from section_digests import enrich_section_digests
+from sds_properties import index_sds_properties
+from regulatory_index import index_regulatory_codes
 
 # Set up OpenAI API key
 os.environ['OPENAI_API_KEY'] = 'ENTER_API_KEY_HERE'
 
-# Initialize ChromaDB client
+# Initialize ChromaDB client and create or get collection, or its shards when SDS_SHARDS is set
 print("Initializing ChromaDB client...")
-chroma_db_path = "Chroma_db_storage"
-client = chromadb.PersistentClient(path=chroma_db_path)
-
-# Create or get collection
-collection_name = "openai_sds_embeddings_metadata"
-try:
-    collection = client.get_collection(collection_name)
-    print(f"Collection '{collection_name}' loaded successfully.")
-except ValueError:  # Collection doesn't exist
-    collection = client.create_collection(collection_name)
-    print(f"Collection '{collection_name}' created successfully.")
+collection = get_shard_router() or get_collection()
+
+# The ingestion journal records progress and points each section at its shared body
+journal = IngestionJournal()
 
 # Load data from Excel file
 print("Loading data from Excel file...")
@@ -33,5 +30,25 @@ print("Processed metadata generated successfully.")
 
 # Store data in ChromaDB
 print("Storing data in ChromaDB...")
-store_sds_documents_to_chromadb(df, collection)
+store_sds_documents_to_chromadb(df, collection, journal)
 print("ChromaDB setup complete.")
+
+# Extract typed section 9/11/14 properties for structured range queries
+print("Indexing structured properties...")
+index_sds_properties(df)
+print("Property table ready.")
+
+# Index H/P codes, CAS and UN numbers for exact and boolean code lookups
+print("Indexing regulatory codes...")
+index_regulatory_codes(df)
+print("Regulatory code index ready.")
+
+# Precompute per-section facet digests answered without a query-time LLM call
+print("Computing section digests...")
+enrich_section_digests(collection, journal)
+print("Section digests ready.")
+
+# Export the collection to the quantized store used for fast filtered search
+print("Building quantized vector store...")
+build_quantized_store(collection, journal=journal)
+print("Quantized vector store ready.")
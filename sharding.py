@@ -0,0 +1,104 @@
+# sharding.py
+# Optional partitioning of the SDS collection into several Chroma collections. Sections are
+# routed to a shard by a hash of their supplier, or by their section_id. Queries that can be
+# routed touch a single shard; the others fan out to every shard in parallel and are merged.
+#
+# Enable it with SDS_SHARDS=<number of shards> and SDS_SHARD_KEY=supplier|section.
+
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+SHARD_KEYS = ("supplier", "section")
+num_shards = int(os.environ.get("SDS_SHARDS", "0"))
+shard_key = os.environ.get("SDS_SHARD_KEY", "supplier")
+
+# Result fields of a Chroma query, merged across shards
+QUERY_FIELDS = ("ids", "documents", "metadatas", "distances", "embeddings")
+
+
+class ShardRouter:
+    """Routes reads and writes over a fixed set of shard collections."""
+
+    def __init__(self, client, base_name, num_shards, shard_key="supplier"):
+        if shard_key not in SHARD_KEYS:
+            raise ValueError(f"Unsupported shard key '{shard_key}'. Must be one of {SHARD_KEYS}")
+        if num_shards < 1:
+            raise ValueError("A shard router needs at least one shard.")
+        self.name = f"{base_name}[{num_shards} shards by {shard_key}]"
+        self.shard_key = shard_key
+        self.collections = [
+            client.get_or_create_collection(f"{base_name}_shard_{i}") for i in range(num_shards)
+        ]
+        self.executor = ThreadPoolExecutor(max_workers=num_shards, thread_name_prefix="shard")
+
+    def __len__(self):
+        return len(self.collections)
+
+    def shard_for(self, supplier=None, section_id=None):
+        """Returns the shard number owning a section."""
+        if self.shard_key == "section":
+            return (int(section_id) - 1) % len(self.collections)
+        # A stable hash, Python's hash() of a str changes between processes
+        return int(hashlib.md5(str(supplier).encode("utf8")).hexdigest(), 16) % len(self.collections)
+
+    def route(self, supplier=None, section_ids=None):
+        """Returns the shard numbers a query has to visit, all of them when it cannot be routed."""
+        if self.shard_key == "supplier" and supplier is not None:
+            return [self.shard_for(supplier=supplier)]
+        if self.shard_key == "section" and section_ids:
+            return sorted({self.shard_for(section_id=section_id) for section_id in section_ids})
+        return list(range(len(self.collections)))
+
+    def query(self, query_embedding, n_results, where=None, supplier=None, section_ids=None,
+              include=("documents", "metadatas", "distances")):
+        """Queries the routed shards in parallel and merges their results by distance.
+
+        Returns a Chroma-style result for a single query embedding.
+        """
+        shards = [self.collections[i] for i in self.route(supplier, section_ids)]
+
+        def query_shard(collection):
+            if not collection.count():
+                return None
+            return collection.query(
+                query_embeddings=[query_embedding], n_results=n_results, where=where, include=list(include)
+            )
+
+        fields = [field for field in QUERY_FIELDS if field == "ids" or field in include]
+        rows = []
+        for result in self.executor.map(query_shard, shards):
+            if result:
+                rows.extend(zip(*(result[field][0] for field in fields)))
+        rows.sort(key=lambda row: row[fields.index("distances")] if "distances" in fields else 0)
+        # A shared body is upserted into every shard of its sections; keep its closest copy only
+        seen = set()
+        rows = [row for row in rows if not (row[0] in seen or seen.add(row[0]))][:n_results]
+        return {field: [[row[i] for row in rows]] for i, field in enumerate(fields)}
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        """Returns the matching records of every shard, Chroma-style."""
+        merged = {"ids": [], **{field: [] for field in include}}
+        results = self.executor.map(
+            lambda collection: collection.get(ids=ids, where=where, include=list(include)), self.collections
+        )
+        seen = set()
+        for result in results:
+            for i, record_id in enumerate(result["ids"]):
+                if record_id in seen:
+                    continue
+                seen.add(record_id)
+                for field in merged:
+                    merged[field].append(result[field][i])
+        return merged
+
+    def find_embedding(self, record_id):
+        """Returns the stored embedding of a record from any shard, or None."""
+        for collection in self.collections:
+            result = collection.get(ids=[record_id], include=["embeddings"])
+            if result["ids"]:
+                return result["embeddings"][0]
+        return None
+
+    def close(self):
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,127 @@
+# Property extraction and range queries, on excerpts of the section texts in df_with_metadata_2.xlsx
+
+import pytest
+
+from sds_properties import PropertyStore, extract_properties, parse_expression
+
+ZSL_20N_SECTION_11 = (
+    "Acute toxicity: Zirconium dioxide (CAS 1314-23-4) LD50 Oral Rat: > 5000 mg/kg bw; "
+    "Skin corrosion/irritation: Zirconium dioxide: Not irritating"
+)
+CESL_30N_SECTION_11 = "Cerium dioxide (CAS 1306-38-3) Acute Oral LD50 Rat > 5000 mg/kg Skin corrosion/irritation "
+CESL_30N_SECTION_9 = "pH > 2.00 - < 3.00 Melting point/freezing point Not available."
+AMINOPYRIDINE_SECTION_11 = (
+    "ACUTE ORAL LD50 (Mouse) = 20 mg /kg, ACUTE ORAL LD50 (Bird) = 10 mg /kg, "
+    "INTRAPERITONEAL (Mouse) = 10 mg/kg, INTRAVENOUS LD50 (Mouse) = 7 mg/kg"
+)
+CINNAMYL_ALCOHOL_SECTION_11 = "LD50 Oral - Rat - female - 2,000 mg/kg. Skin corrosion/irritation: No data available"
+AMINOPHENOL_SECTION_11 = "ihl-rat LC50:>5 mg/kg/1H orl-rat LD50:375 mg/kg Skin corrosion/irritation"
+PERACETIC_ACID_SECTION_9 = "pH: < 1,0, l) Viscosity: Viscosity, kinematic: No data available"
+THEMAH_SECTION_9 = "Melting point: < -18.8 Â°F / < -28.2 â„ƒ, Flash point: 180 Â°F / 82 â„ƒ"
+NALCO_1034A_SECTION_9 = (
+    "Flash point: does not flash, pH: 3 - 4,(100 %), Method: ASTM E 70, Odour Threshold: no data available"
+)
+NALCO_1050_SECTION_9 = "Flash point: does not flash, pH: 8.8 - 9.2,(100 %), Method: ASTM E 70"
+IDISIL_KE_90_SECTION_9 = (
+    "Flash Point: not relevant, since based on water Auto-ignition temperature: not flammable "
+    "Decomposition Temperature: 212 ÂºF/100 â„ƒ liberation of: water. pH: 10"
+)
+PHENYLENEDIAMINE_SECTION_9 = "Vapor Pressure: .13 mbar @ 20 â„ƒ, Vapor Density: Not applicable"
+AMP_ULTRA_SECTION_9 = "Boiling point/boiling range: 212 - 329 Â°F / 100 - 165 Â°C; Flash point: 179.76 Â°F / 82.09 Â°C"
+
+
+def only(properties, name):
+    matches = [p for p in properties if p["property"] == name]
+    assert len(matches) == 1, matches
+    return matches[0]
+
+
+def test_lower_bound_leaves_the_maximum_open():
+    ld50 = only(extract_properties(11, ZSL_20N_SECTION_11), "ld50_oral")
+    assert (ld50["value"], ld50["value_max"], ld50["value_op"]) == (5000, None, ">")
+    assert (ld50["unit"], ld50["species"]) == ("mg/kg", "rat")
+
+
+def test_bounded_range_keeps_both_operators():
+    ph = only(extract_properties(9, CESL_30N_SECTION_9), "ph")
+    assert (ph["value"], ph["value_max"], ph["value_op"], ph["value_max_op"]) == (2.0, 3.0, ">", "<")
+
+
+def test_upper_bound_leaves_the_minimum_open():
+    ph = only(extract_properties(9, PERACETIC_ACID_SECTION_9), "ph")
+    assert (ph["value"], ph["value_max"], ph["value_max_op"]) == (None, 1.0, "<")
+    melting_point = only(extract_properties(9, THEMAH_SECTION_9), "melting_point")
+    assert (melting_point["value"], melting_point["value_max"]) == (None, -28.22)
+
+
+def test_species_are_recorded():
+    rows = [p for p in extract_properties(11, AMINOPYRIDINE_SECTION_11) if p["property"] == "ld50_oral"]
+    assert [(p["value"], p["species"]) for p in rows] == [(20, "mouse"), (10, "bird")]
+    aminophenol = extract_properties(11, AMINOPHENOL_SECTION_11)
+    assert only(aminophenol, "lc50_inhalation")["species"] == "rat"
+    assert only(aminophenol, "lc50_inhalation")["value_op"] == ">"
+
+
+@pytest.mark.parametrize("text", [NALCO_1034A_SECTION_9, NALCO_1050_SECTION_9, IDISIL_KE_90_SECTION_9])
+def test_non_flashing_products_have_no_flash_point(text):
+    properties = extract_properties(9, text)
+    assert not [p for p in properties if p["property"] in ("flash_point", "autoignition_temperature")]
+    assert only(properties, "ph")["value"] in (3.0, 8.8, 10.0)
+
+
+def test_value_after_a_sub_label():
+    boiling_point = only(extract_properties(9, AMP_ULTRA_SECTION_9), "boiling_point")
+    assert (boiling_point["value"], boiling_point["value_max"]) == (100.0, 165.0)
+
+
+def test_leading_dot_decimal():
+    vapour_pressure = only(extract_properties(9, PHENYLENEDIAMINE_SECTION_9), "vapour_pressure")
+    assert vapour_pressure["value"] == pytest.approx(0.013)
+
+
+def test_thousands_separator():
+    ld50 = only(extract_properties(11, CINNAMYL_ALCOHOL_SECTION_11), "ld50_oral")
+    assert (ld50["value"], ld50["species"]) == (2000, "rat")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PropertyStore(str(tmp_path / "journal.db"))
+    for product, section_id, text in (
+        ("ZSL-20N", 11, ZSL_20N_SECTION_11),
+        ("CESL-30N", 11, CESL_30N_SECTION_11),
+        ("CESL-30N", 9, CESL_30N_SECTION_9),
+        ("4-Aminopyridine", 11, AMINOPYRIDINE_SECTION_11),
+        ("Cinnamyl alcohol", 11, CINNAMYL_ALCOHOL_SECTION_11),
+        ("Peracetic acid solution", 9, PERACETIC_ACID_SECTION_9),
+        ("NALCO 1034A", 9, NALCO_1034A_SECTION_9),
+        ("IDISIL KE 90", 9, IDISIL_KE_90_SECTION_9),
+    ):
+        store.replace_section(product, "Supplier", section_id, extract_properties(section_id, text))
+    return store
+
+
+def products(rows):
+    return sorted({row["product_name"] for row in rows})
+
+
+@pytest.mark.parametrize("expression, expected", [
+    ("ld50 oral <= 5000", ["4-Aminopyridine", "Cinnamyl alcohol"]),
+    ("ld50 oral >= 5000", ["CESL-30N", "ZSL-20N"]),
+    ("ld50 oral > 2000", ["CESL-30N", "ZSL-20N"]),
+    ("ph = 2.5", ["CESL-30N"]),
+    ("ph = 3", ["NALCO 1034A"]),
+    ("ph < 2", ["Peracetic acid solution"]),
+    ("flash point < 60 °C", []),
+    ("decomposition temperature = 100", ["IDISIL KE 90"]),
+    ("ph >= 1", ["CESL-30N", "IDISIL KE 90", "NALCO 1034A"]),
+])
+def test_open_bounds_in_range_queries(store, expression, expected):
+    property_name, operator, value = parse_expression(expression)
+    bounds = {"=": {"equals": value}, "<": {"maximum": value, "exclusive_max": True}, "<=": {"maximum": value},
+              ">": {"minimum": value, "exclusive_min": True}, ">=": {"minimum": value}}[operator]
+    assert products(store.query(property_name, **bounds)) == expected
+
+
+def test_species_filter(store):
+    assert [row["value"] for row in store.query("ld50_oral", species="bird")] == [10]